@@ -12,9 +12,21 @@ CREATE TABLE IF NOT EXISTS dim_date (
     year         INTEGER NOT NULL,
     month        INTEGER NOT NULL,
     day          INTEGER NOT NULL,
-    quarter      INTEGER NOT NULL
+    quarter      INTEGER NOT NULL,
+    week         INTEGER,               -- неделя года (1-53, от 1 января)
+    iso_year     INTEGER,
+    iso_week     INTEGER,               -- неделя по ISO 8601
+    day_of_week  INTEGER,               -- 1 = понедельник ... 7 = воскресенье
+    month_name   VARCHAR(20)
 );
 
+-- Календарные атрибуты для баз, созданных до их появления
+ALTER TABLE dim_date ADD COLUMN IF NOT EXISTS week INTEGER;
+ALTER TABLE dim_date ADD COLUMN IF NOT EXISTS iso_year INTEGER;
+ALTER TABLE dim_date ADD COLUMN IF NOT EXISTS iso_week INTEGER;
+ALTER TABLE dim_date ADD COLUMN IF NOT EXISTS day_of_week INTEGER;
+ALTER TABLE dim_date ADD COLUMN IF NOT EXISTS month_name VARCHAR(20);
+
 -- 2. Измерение товаров
 CREATE TABLE IF NOT EXISTS dim_product (
     product_key  SERIAL PRIMARY KEY,
@@ -23,8 +35,10 @@ CREATE TABLE IF NOT EXISTS dim_product (
     name         VARCHAR(200),
     category     VARCHAR(100),
     min_quantity INTEGER,
-    max_quantity INTEGER
+    max_quantity INTEGER,
+    row_hash     CHAR(32)               -- md5 отслеживаемых колонок, для обнаружения изменений
 );
+ALTER TABLE dim_product ADD COLUMN IF NOT EXISTS row_hash CHAR(32);
 
 -- 3. Измерение складов
 CREATE TABLE IF NOT EXISTS dim_warehouse (
@@ -33,8 +47,10 @@ CREATE TABLE IF NOT EXISTS dim_warehouse (
     code          VARCHAR(20),
     name          VARCHAR(100),
     location      VARCHAR(200),
-    max_capacity  INTEGER
+    max_capacity  INTEGER,
+    row_hash      CHAR(32)
 );
+ALTER TABLE dim_warehouse ADD COLUMN IF NOT EXISTS row_hash CHAR(32);
 
 -- 4. Измерение поставщиков
 CREATE TABLE IF NOT EXISTS dim_supplier (
@@ -43,8 +59,10 @@ CREATE TABLE IF NOT EXISTS dim_supplier (
     name         VARCHAR(200),
     contact_person VARCHAR(100),
     phone        VARCHAR(50),
-    rating       NUMERIC(3,1)
+    rating       NUMERIC(3,1),
+    row_hash     CHAR(32)
 );
+ALTER TABLE dim_supplier ADD COLUMN IF NOT EXISTS row_hash CHAR(32);
 
 -- 5. Измерение типа движения
 CREATE TABLE IF NOT EXISTS dim_movement_type (
@@ -54,8 +72,26 @@ CREATE TABLE IF NOT EXISTS dim_movement_type (
 
 
 
+-- Таблица фактов секционирована по date_key помесячно.
+-- Старая несекционированная таблица удаляется: факты целиком восстанавливаются из OLTP
+-- следующим запуском ETL (watermark сбрасывается).
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1
+               FROM pg_class c
+               JOIN pg_namespace n ON n.oid = c.relnamespace
+               WHERE n.nspname = 'dwh'
+                 AND c.relname = 'fact_inventory_movement'
+                 AND c.relkind = 'r') THEN
+        DROP TABLE dwh.fact_inventory_movement;
+        IF to_regclass('dwh.etl_watermark') IS NOT NULL THEN
+            DELETE FROM dwh.etl_watermark WHERE table_name = 'fact_inventory_movement';
+        END IF;
+    END IF;
+END $$;
+
 CREATE TABLE IF NOT EXISTS fact_inventory_movement (
-    movement_key      BIGSERIAL PRIMARY KEY,
+    movement_key      BIGSERIAL,
     
     date_key          INTEGER NOT NULL,
     product_key       INTEGER NOT NULL,
@@ -69,6 +105,9 @@ CREATE TABLE IF NOT EXISTS fact_inventory_movement (
 
     source_movement_id INTEGER,
     
+    -- ключ секционирования обязан входить в первичный и уникальные ключи
+    PRIMARY KEY (movement_key, date_key),
+
     CONSTRAINT fk_fact_date
         FOREIGN KEY (date_key) REFERENCES dim_date (date_key),
     CONSTRAINT fk_fact_product
@@ -79,10 +118,71 @@ CREATE TABLE IF NOT EXISTS fact_inventory_movement (
         FOREIGN KEY (supplier_key) REFERENCES dim_supplier (supplier_key),
     CONSTRAINT fk_fact_mtype
         FOREIGN KEY (movement_type_key) REFERENCES dim_movement_type (movement_type_key)
-);
+) PARTITION BY RANGE (date_key);
+
+-- Месячные секции fact_inventory_movement_YYYYMM создаёт ETL (см. ensure_fact_partitions),
+-- сюда попадают только строки вне созданных секций
+CREATE TABLE IF NOT EXISTS fact_inventory_movement_default
+    PARTITION OF fact_inventory_movement DEFAULT;
 
 
 CREATE INDEX IF NOT EXISTS idx_fact_date ON fact_inventory_movement(date_key);
 CREATE INDEX IF NOT EXISTS idx_fact_product ON fact_inventory_movement(product_key);
 CREATE INDEX IF NOT EXISTS idx_fact_warehouse ON fact_inventory_movement(warehouse_key);
 CREATE INDEX IF NOT EXISTS idx_fact_mtype ON fact_inventory_movement(movement_type_key);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_fact_source_movement ON fact_inventory_movement(source_movement_id, date_key);
+
+
+-- Агрегаты для отчётов DWH, поддерживаются ETL инкрементально по затронутым датам
+CREATE TABLE IF NOT EXISTS agg_daily_movement (
+    date_key          INTEGER NOT NULL,
+    product_key       INTEGER NOT NULL,
+    warehouse_key     INTEGER NOT NULL,
+    movement_type_key INTEGER NOT NULL,
+    quantity_sum      BIGINT NOT NULL,
+    value_sum         NUMERIC(18,2) NOT NULL,
+    movement_count    BIGINT NOT NULL,
+    PRIMARY KEY (date_key, product_key, warehouse_key, movement_type_key)
+);
+
+CREATE TABLE IF NOT EXISTS agg_date_movement (
+    date_key          INTEGER PRIMARY KEY,
+    quantity_sum      BIGINT NOT NULL,
+    value_sum         NUMERIC(18,2) NOT NULL,
+    movement_count    BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS agg_product_movement (
+    product_key       INTEGER PRIMARY KEY,
+    quantity_sum      BIGINT NOT NULL,
+    value_sum         NUMERIC(18,2) NOT NULL,
+    movement_count    BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS agg_warehouse_movement (
+    warehouse_key     INTEGER PRIMARY KEY,
+    quantity_sum      BIGINT NOT NULL,
+    value_sum         NUMERIC(18,2) NOT NULL,
+    movement_count    BIGINT NOT NULL
+);
+
+
+-- Служебная таблица ETL: high-water mark инкрементальной загрузки
+CREATE TABLE IF NOT EXISTS etl_watermark (
+    table_name         VARCHAR(100) PRIMARY KEY,
+    last_movement_id   INTEGER NOT NULL DEFAULT 0,
+    last_movement_date TIMESTAMP,
+    updated_at         TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Журнал запусков ETL: время и число строк по этапам (см. EtlTelemetry в etl.py)
+CREATE TABLE IF NOT EXISTS etl_run (
+    run_id       BIGSERIAL PRIMARY KEY,
+    started_at   TIMESTAMP NOT NULL,
+    finished_at  TIMESTAMP NOT NULL,
+    status       VARCHAR(20) NOT NULL,
+    mode         VARCHAR(100),
+    seconds      NUMERIC(12,3),
+    stages       JSONB,
+    error        TEXT
+);
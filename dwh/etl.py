@@ -1,6 +1,13 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import tempfile
+import time
 import psycopg2
-from datetime import datetime
-from contextlib import closing
+from psycopg2.extras import Json, execute_values
+from datetime import date, datetime, timedelta
+from contextlib import closing, contextmanager
 
 OLTP_CONFIG = {
     "host": "localhost",
@@ -18,6 +25,78 @@ DWH_CONFIG = {
     "port": 5432,
 }
 
+# Диапазон календаря dim_date по умолчанию: с этой даты до конца следующего года
+DEFAULT_CALENDAR_START = date(2020, 1, 1)
+
+# Сколько месячных секций fact_inventory_movement создавать заранее, начиная с текущего месяца
+PARTITIONS_AHEAD_MONTHS = 3
+
+# Размер пачки движений, которая проходит extract -> transform -> load за один шаг
+DEFAULT_CHUNK_SIZE = 10000
+
+# Буфер COPY держим в памяти до этого размера, дальше он сбрасывается во временный файл
+COPY_SPOOL_MAX_SIZE = 64 * 1024 * 1024
+
+FACT_COLUMNS = (
+    "date_key",
+    "product_key",
+    "warehouse_key",
+    "supplier_key",
+    "movement_type_key",
+    "quantity",
+    "unit_price",
+    "total_value",
+    "source_movement_id",
+)
+
+
+class EtlTelemetry:
+    """
+    Метрики этапов ETL: время, строки на входе и выходе, отброшенные строки.
+    Конвейер фактов работает пачками, поэтому метрики этапа суммируются по всем пачкам.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started_at = datetime.utcnow()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        st = self.stages.setdefault(name, {"seconds": 0.0, "rows_in": 0, "rows_out": 0, "rows_skipped": 0})
+        started = time.perf_counter()
+        try:
+            yield st
+        finally:
+            st["seconds"] += time.perf_counter() - started
+
+    def merge(self, stages):
+        """
+        Добавляем метрики рабочего процесса (время разных процессов складывается).
+        """
+        for name, other in stages.items():
+            st = self.stages.setdefault(name, {"seconds": 0.0, "rows_in": 0, "rows_out": 0, "rows_skipped": 0})
+            for field, value in other.items():
+                st[field] += value
+
+    def summary(self):
+        return [
+            {
+                "stage": name,
+                "seconds": round(st["seconds"], 3),
+                "rows_in": st["rows_in"],
+                "rows_out": st["rows_out"],
+                "rows_skipped": st["rows_skipped"],
+                "rows_per_sec": round(st["rows_out"] / st["seconds"]) if st["seconds"] > 0 else None,
+            }
+            for name, st in self.stages.items()
+        ]
+
+
+telemetry = EtlTelemetry()
+
 
 def get_conn(cfg):
     return psycopg2.connect(
@@ -32,38 +111,161 @@ def get_conn(cfg):
 
 def ensure_movement_types(cur_oltp, cur_dwh):
     """
-    Загружаем все уникальные типы движений из OLTP в измерение dim_movement_type.
+    Загружаем все уникальные типы движений из OLTP в измерение dim_movement_type одним запросом.
     """
     cur_oltp.execute("SELECT DISTINCT movement_type FROM inventory_movement")
     types = cur_oltp.fetchall()
-    for (mt,) in types:
-        cur_dwh.execute("""
-            INSERT INTO dwh.dim_movement_type (movement_type)
-            VALUES (%s)
-            ON CONFLICT (movement_type) DO NOTHING
-        """, (mt,))
-
-
-def ensure_date(cur_dwh, dt):
-    """
-    Гарантируем, что дата dt есть в dim_date.
-    Возвращаем date_key (формат YYYYMMDD).
-    """
-    date_key = int(dt.strftime("%Y%m%d"))
-    cur_dwh.execute("SELECT 1 FROM dwh.dim_date WHERE date_key = %s", (date_key,))
-    if cur_dwh.fetchone() is None:
-        cur_dwh.execute("""
-            INSERT INTO dwh.dim_date (date_key, full_date, year, month, day, quarter)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (
-            date_key,
-            dt.date(),
-            dt.year,
-            dt.month,
-            dt.day,
-            (dt.month - 1) // 3 + 1
-        ))
-    return date_key
+    if not types:
+        return {"inserted": 0, "updated": 0, "unchanged": 0}
+    inserted = execute_values(cur_dwh, """
+        INSERT INTO dwh.dim_movement_type (movement_type)
+        VALUES %s
+        ON CONFLICT (movement_type) DO NOTHING
+        RETURNING movement_type_key
+    """, types, fetch=True)
+    return {"inserted": len(inserted), "updated": 0, "unchanged": len(types) - len(inserted)}
+
+
+def date_key_of(dt):
+    """
+    Суррогатный ключ даты в формате YYYYMMDD, вычисляется без обращения к БД.
+    """
+    return dt.year * 10000 + dt.month * 100 + dt.day
+
+
+def ensure_calendar(cur_dwh, start_date, end_date):
+    """
+    Заполняем dim_date всеми днями диапазона [start_date, end_date] одним запросом.
+    Уже существующие даты не трогаем, кроме строк без календарных атрибутов
+    (добавлены до появления колонок week/iso_week/day_of_week/month_name).
+    """
+    if start_date > end_date:
+        return
+    cur_dwh.execute("""
+        INSERT INTO dwh.dim_date
+            (date_key, full_date, year, month, day, quarter,
+             week, iso_year, iso_week, day_of_week, month_name)
+        SELECT to_char(d, 'YYYYMMDD')::int,
+               d,
+               extract(year FROM d)::int,
+               extract(month FROM d)::int,
+               extract(day FROM d)::int,
+               extract(quarter FROM d)::int,
+               to_char(d, 'WW')::int,
+               extract(isoyear FROM d)::int,
+               extract(week FROM d)::int,
+               extract(isodow FROM d)::int,
+               (ARRAY['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь', 'Июль',
+                      'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь'])[extract(month FROM d)::int]
+        FROM (SELECT g::date AS d
+              FROM generate_series(%s::date, %s::date, interval '1 day') AS g) s
+        ON CONFLICT (date_key) DO UPDATE
+        SET week = EXCLUDED.week,
+            iso_year = EXCLUDED.iso_year,
+            iso_week = EXCLUDED.iso_week,
+            day_of_week = EXCLUDED.day_of_week,
+            month_name = EXCLUDED.month_name
+        WHERE dim_date.iso_week IS NULL
+    """, (start_date, end_date))
+
+
+def extend_calendar(cur_dwh, min_date, max_date):
+    """
+    Расширяем dim_date, если даты загружаемой пачки выходят за имеющийся диапазон.
+    """
+    cur_dwh.execute("SELECT min(full_date), max(full_date) FROM dwh.dim_date")
+    cal_start, cal_end = cur_dwh.fetchone()
+    if cal_start is None:
+        ensure_calendar(cur_dwh, min_date, max_date)
+        return
+    if min_date < cal_start:
+        print(f"Расширяем календарь назад до {min_date}")
+        ensure_calendar(cur_dwh, min_date, cal_start - timedelta(days=1))
+    if max_date > cal_end:
+        print(f"Расширяем календарь вперёд до {max_date}")
+        ensure_calendar(cur_dwh, cal_end + timedelta(days=1), max_date)
+
+
+def month_start(d):
+    return d.replace(day=1)
+
+
+def next_month(d):
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def fact_partition_name(month):
+    return f"fact_inventory_movement_{month.year}{month.month:02d}"
+
+
+def get_fact_partitions(cur_dwh):
+    cur_dwh.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'dwh.fact_inventory_movement'::regclass
+    """)
+    return {r[0] for r in cur_dwh.fetchall()}
+
+
+def ensure_fact_partitions(cur_dwh, min_date, max_date):
+    """
+    Создаём недостающие месячные секции fact_inventory_movement для дат [min_date, max_date].
+    Секция за месяц M хранит date_key в диапазоне [YYYYMM01, первое число следующего месяца).
+    """
+    existing = get_fact_partitions(cur_dwh)
+    month = month_start(min_date)
+    while month <= max_date:
+        name = fact_partition_name(month)
+        if name not in existing:
+            cur_dwh.execute(f"""
+                CREATE TABLE IF NOT EXISTS dwh.{name}
+                PARTITION OF dwh.fact_inventory_movement
+                FOR VALUES FROM ({date_key_of(month)}) TO ({date_key_of(next_month(month))})
+            """)
+        month = next_month(month)
+
+
+def merge_dimension(cur_dwh, table, natural_key, columns, rows):
+    """
+    Пакетная загрузка измерения:
+    1. execute_values во временную staging-таблицу.
+    2. Один INSERT ... SELECT ... ON CONFLICT, который обновляет строку
+       только если изменился md5-хеш отслеживаемых колонок (row_hash).
+    columns - отслеживаемые колонки без natural key.
+    Возвращаем счётчики {"inserted", "updated", "unchanged"}.
+    """
+    stage = "stage_" + table.split(".")[-1]
+    all_columns = (natural_key,) + tuple(columns)
+    column_list = ", ".join(all_columns)
+
+    cur_dwh.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {stage} ON COMMIT DROP AS
+        SELECT {column_list} FROM {table} WITH NO DATA
+    """)
+    cur_dwh.execute(f"TRUNCATE {stage}")
+    execute_values(cur_dwh, f"INSERT INTO {stage} ({column_list}) VALUES %s", rows, page_size=1000)
+
+    row_hash = "md5(ROW(" + ", ".join(f"s.{c}" for c in columns) + ")::text)"
+    update_set = ",\n                ".join(f"{c} = EXCLUDED.{c}" for c in columns + ("row_hash",))
+    cur_dwh.execute(f"""
+        INSERT INTO {table} ({column_list}, row_hash)
+        SELECT {", ".join("s." + c for c in all_columns)}, {row_hash}
+        FROM {stage} s
+        ON CONFLICT ({natural_key}) DO UPDATE
+        SET {update_set}
+        WHERE {table.split(".")[-1]}.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+        RETURNING (xmax = 0) AS inserted
+    """)
+    changed = [r[0] for r in cur_dwh.fetchall()]
+    inserted = sum(1 for r in changed if r)
+    updated = len(changed) - inserted
+    return {"inserted": inserted, "updated": updated, "unchanged": len(rows) - inserted - updated}
+
+
+def print_merge_stats(name, stats):
+    print(f"{name}: добавлено {stats['inserted']}, обновлено {stats['updated']}, "
+          f"без изменений {stats['unchanged']}")
 
 
 def load_dim_products(cur_oltp, cur_dwh):
@@ -74,18 +276,9 @@ def load_dim_products(cur_oltp, cur_dwh):
         SELECT id, sku, name, category, min_quantity, max_quantity
         FROM product
     """)
-    for row in cur_oltp.fetchall():
-        product_id, sku, name, category, min_q, max_q = row
-        cur_dwh.execute("""
-            INSERT INTO dwh.dim_product (product_id, sku, name, category, min_quantity, max_quantity)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (product_id) DO UPDATE
-            SET sku = EXCLUDED.sku,
-                name = EXCLUDED.name,
-                category = EXCLUDED.category,
-                min_quantity = EXCLUDED.min_quantity,
-                max_quantity = EXCLUDED.max_quantity
-        """, (product_id, sku, name, category, min_q, max_q))
+    return merge_dimension(cur_dwh, "dwh.dim_product", "product_id",
+                           ("sku", "name", "category", "min_quantity", "max_quantity"),
+                           cur_oltp.fetchall())
 
 
 def load_dim_warehouses(cur_oltp, cur_dwh):
@@ -96,17 +289,9 @@ def load_dim_warehouses(cur_oltp, cur_dwh):
         SELECT id, code, name, location, max_capacity
         FROM warehouse
     """)
-    for row in cur_oltp.fetchall():
-        warehouse_id, code, name, location, max_capacity = row
-        cur_dwh.execute("""
-            INSERT INTO dwh.dim_warehouse (warehouse_id, code, name, location, max_capacity)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (warehouse_id) DO UPDATE
-            SET code = EXCLUDED.code,
-                name = EXCLUDED.name,
-                location = EXCLUDED.location,
-                max_capacity = EXCLUDED.max_capacity
-        """, (warehouse_id, code, name, location, max_capacity))
+    return merge_dimension(cur_dwh, "dwh.dim_warehouse", "warehouse_id",
+                           ("code", "name", "location", "max_capacity"),
+                           cur_oltp.fetchall())
 
 
 def load_dim_suppliers(cur_oltp, cur_dwh):
@@ -117,148 +302,824 @@ def load_dim_suppliers(cur_oltp, cur_dwh):
         SELECT id, name, contact_person, phone, rating
         FROM supplier
     """)
-    for row in cur_oltp.fetchall():
-        supplier_id, name, contact_person, phone, rating = row
-        cur_dwh.execute("""
-            INSERT INTO dwh.dim_supplier (supplier_id, name, contact_person, phone, rating)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (supplier_id) DO UPDATE
-            SET name = EXCLUDED.name,
-                contact_person = EXCLUDED.contact_person,
-                phone = EXCLUDED.phone,
-                rating = EXCLUDED.rating
-        """, (supplier_id, name, contact_person, phone, rating))
-
-
-def get_product_key(cur_dwh, product_id):
-    cur_dwh.execute("SELECT product_key FROM dwh.dim_product WHERE product_id = %s", (product_id,))
-    res = cur_dwh.fetchone()
-    return res[0] if res else None
+    return merge_dimension(cur_dwh, "dwh.dim_supplier", "supplier_id",
+                           ("name", "contact_person", "phone", "rating"),
+                           cur_oltp.fetchall())
 
 
-def get_warehouse_key(cur_dwh, warehouse_id):
-    cur_dwh.execute("SELECT warehouse_key FROM dwh.dim_warehouse WHERE warehouse_id = %s", (warehouse_id,))
+def get_watermark(cur_dwh, table_name="fact_inventory_movement"):
+    """
+    Читаем high-water mark инкрементальной загрузки из dwh.etl_watermark.
+    Возвращаем (last_movement_id, last_movement_date) или (0, None), если загрузок ещё не было.
+    """
+    cur_dwh.execute("""
+        SELECT last_movement_id, last_movement_date
+        FROM dwh.etl_watermark
+        WHERE table_name = %s
+    """, (table_name,))
     res = cur_dwh.fetchone()
-    return res[0] if res else None
+    return (res[0], res[1]) if res else (0, None)
 
 
-def get_supplier_key(cur_dwh, supplier_id):
-    if supplier_id is None:
-        return None
-    cur_dwh.execute("SELECT supplier_key FROM dwh.dim_supplier WHERE supplier_id = %s", (supplier_id,))
-    res = cur_dwh.fetchone()
-    return res[0] if res else None
+def set_watermark(cur_dwh, last_movement_id, last_movement_date,
+                  table_name="fact_inventory_movement"):
+    """
+    Сохраняем high-water mark после успешной загрузки фактов.
+    """
+    cur_dwh.execute("""
+        INSERT INTO dwh.etl_watermark (table_name, last_movement_id, last_movement_date, updated_at)
+        VALUES (%s, %s, %s, now())
+        ON CONFLICT (table_name) DO UPDATE
+        SET last_movement_id = EXCLUDED.last_movement_id,
+            last_movement_date = EXCLUDED.last_movement_date,
+            updated_at = EXCLUDED.updated_at
+    """, (table_name, last_movement_id, last_movement_date))
 
 
-def get_movement_type_key(cur_dwh, movement_type):
-    cur_dwh.execute("SELECT movement_type_key FROM dwh.dim_movement_type WHERE movement_type = %s", (movement_type,))
-    res = cur_dwh.fetchone()
-    return res[0] if res else None
+class DimensionKeyCache:
+    """
+    Кэш соответствия natural key -> surrogate key одного измерения.
+    Загружается одним запросом на запуск ETL, дальше поиск ключа - обращение к словарю.
+    """
+
+    def __init__(self, table, natural_key, surrogate_key):
+        self.table = table
+        self.natural_key = natural_key
+        self.surrogate_key = surrogate_key
+        self.keys = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, cur_dwh):
+        cur_dwh.execute(f"SELECT {self.natural_key}, {self.surrogate_key} FROM {self.table}")
+        self.keys = dict(cur_dwh.fetchall())
+        return self
+
+    def get(self, natural_key):
+        if natural_key is None:
+            return None
+        key = self.keys.get(natural_key)
+        if key is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return key
 
+    def add_missing(self, cur_dwh, natural_keys):
+        """
+        Вставляем отсутствующие в кэше значения одним запросом
+        и подгружаем их суррогатные ключи.
+        Подходит для измерений, у которых кроме natural key нет обязательных колонок.
+        """
+        missing = sorted({k for k in natural_keys if k is not None and k not in self.keys})
+        if not missing:
+            return
+        execute_values(cur_dwh, f"""
+            INSERT INTO {self.table} ({self.natural_key})
+            VALUES %s
+            ON CONFLICT ({self.natural_key}) DO NOTHING
+        """, [(k,) for k in missing])
+        cur_dwh.execute(f"""
+            SELECT {self.natural_key}, {self.surrogate_key}
+            FROM {self.table}
+            WHERE {self.natural_key} = ANY(%s)
+        """, (missing,))
+        self.keys.update(cur_dwh.fetchall())
 
-def load_fact_inventory_movements(cur_oltp, cur_dwh, full_reload=True):
+    def stats(self):
+        return {"size": len(self.keys), "hits": self.hits, "misses": self.misses}
+
+
+def load_key_caches(cur_dwh):
     """
-    Загружаем таблицу фактов fact_inventory_movement.
-    full_reload=True: перед загрузкой очищаем таблицу фактов и грузим всё с нуля.
-    Для учебного прототипа это нормально.
+    Загружаем кэши суррогатных ключей всех измерений, на которые ссылается таблица фактов.
     """
-    if full_reload:
-        print("Очищаем таблицу фактов fact_inventory_movement...")
-        cur_dwh.execute("DELETE FROM dwh.fact_inventory_movement")
+    return {
+        "product": DimensionKeyCache("dwh.dim_product", "product_id", "product_key").load(cur_dwh),
+        "warehouse": DimensionKeyCache("dwh.dim_warehouse", "warehouse_id", "warehouse_key").load(cur_dwh),
+        "supplier": DimensionKeyCache("dwh.dim_supplier", "supplier_id", "supplier_key").load(cur_dwh),
+        "movement_type": DimensionKeyCache(
+            "dwh.dim_movement_type", "movement_type", "movement_type_key").load(cur_dwh),
+    }
 
-    # Берём все движения из OLTP
-    cur_oltp.execute("""
-        SELECT im.id,
-               im.product_id,
-               im.warehouse_id,
-               p.supplier_id,
-               im.movement_type,
-               im.quantity,
-               im.unit_price,
-               im.total_value,
-               im.movement_date
-        FROM inventory_movement im
-        JOIN product p ON p.id = im.product_id
-    """)
-    rows = cur_oltp.fetchall()
-    print(f"Найдено движений для загрузки: {len(rows)}")
 
+def print_key_cache_stats(key_caches):
+    for name, cache in key_caches.items():
+        st = cache.stats()
+        print(f"Кэш ключей {name}: строк {st['size']}, попаданий {st['hits']}, промахов {st['misses']}")
+
+
+def extract_movements(cur_oltp, last_id, chunk_size=DEFAULT_CHUNK_SIZE, max_id=None,
+                      date_from=None, date_to=None):
+    """
+    Генератор: отдаёт движения OLTP с id больше last_id пачками по chunk_size строк.
+    Дополнительно можно ограничить id сверху (max_id) и дату движения
+    полуинтервалом [date_from, date_to).
+    Чтение идёт через именованный (server-side) курсор, поэтому в памяти процесса
+    одновременно находится не больше одной пачки.
+    """
+    conditions = ["im.id > %s"]
+    params = [last_id]
+    if max_id is not None:
+        conditions.append("im.id <= %s")
+        params.append(max_id)
+    if date_from is not None:
+        conditions.append("im.movement_date >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("im.movement_date < %s")
+        params.append(date_to)
+    with cur_oltp.connection.cursor(name="etl_extract_movements") as cur:
+        cur.itersize = chunk_size
+        with telemetry.stage("extract"):
+            cur.execute(f"""
+                SELECT im.id,
+                       im.product_id,
+                       im.warehouse_id,
+                       p.supplier_id,
+                       im.movement_type,
+                       im.quantity,
+                       im.unit_price,
+                       im.total_value,
+                       im.movement_date
+                FROM inventory_movement im
+                JOIN product p ON p.id = im.product_id
+                WHERE {" AND ".join(conditions)}
+                ORDER BY im.id
+            """, params)
+        while True:
+            with telemetry.stage("extract") as st:
+                rows = cur.fetchmany(chunk_size)
+                st["rows_out"] += len(rows)
+            if not rows:
+                return
+            yield rows
+
+
+def transform_chunks(cur_dwh, chunks, key_caches):
+    """
+    Генератор: для каждой пачки из extract_movements отдаёт
+    (число строк, последний movement_id, максимальная movement_date, строки фактов).
+    Движения без даты пропускаются на всех путях загрузки (инкрементальной,
+    параллельной и перезагрузке месяца): месяц такого движения не определён,
+    а подстановка даты загрузки давала бы разный результат при каждой перезагрузке.
+    Если в пачке нет ни одной датированной строки, максимальная дата равна None.
+    """
+    for rows in chunks:
+        with telemetry.stage("transform") as st:
+            dated = [row for row in rows if row[8] is not None]
+            chunk_max_date = None
+            facts = []
+            if dated:
+                chunk_min_date = min(row[8] for row in dated)
+                chunk_max_date = max(row[8] for row in dated)
+                extend_calendar(cur_dwh, chunk_min_date.date(), chunk_max_date.date())
+                ensure_fact_partitions(cur_dwh, chunk_min_date.date(), chunk_max_date.date())
+                facts = transform_movements(cur_dwh, dated, key_caches)
+            st["rows_in"] += len(rows)
+            st["rows_out"] += len(facts)
+            # движения без даты, без товара или склада в измерениях
+            st["rows_skipped"] += len(rows) - len(facts)
+        yield len(rows), rows[-1][0], chunk_max_date, facts
+
+
+def transform_movements(cur_dwh, rows, key_caches):
+    """
+    Превращаем строки OLTP в строки фактов (порядок колонок FACT_COLUMNS),
+    подставляя суррогатные ключи из кэшей.
+    Движения без товара или склада в измерениях отбрасываются.
+    """
+    key_caches["movement_type"].add_missing(cur_dwh, {row[4] for row in rows})
+
+    facts = []
     for (mov_id, product_id, warehouse_id, supplier_id,
          movement_type, quantity, unit_price, total_value, movement_date) in rows:
 
-        if movement_date is None:
-            movement_date = datetime.utcnow()
-
-        # dim_date
-        date_key = ensure_date(cur_dwh, movement_date)
+        # dim_date (календарь заполнен заранее, ключ вычисляется арифметически)
+        date_key = date_key_of(movement_date)
 
         # dim_product
-        product_key = get_product_key(cur_dwh, product_id)
+        product_key = key_caches["product"].get(product_id)
         if product_key is None:
             continue
 
         # dim_warehouse
-        warehouse_key = get_warehouse_key(cur_dwh, warehouse_id)
+        warehouse_key = key_caches["warehouse"].get(warehouse_id)
         if warehouse_key is None:
             continue
 
-        # dim_supplier
-        supplier_key = get_supplier_key(cur_dwh, supplier_id)
-
-        # dim_movement_type
-        movement_type_key = get_movement_type_key(cur_dwh, movement_type)
-        if movement_type_key is None:
-            cur_dwh.execute("""
-                INSERT INTO dwh.dim_movement_type (movement_type)
-                VALUES (%s)
-                ON CONFLICT (movement_type) DO NOTHING
-            """, (movement_type,))
-            movement_type_key = get_movement_type_key(cur_dwh, movement_type)
-
-        cur_dwh.execute("""
-            INSERT INTO dwh.fact_inventory_movement
-                (date_key, product_key, warehouse_key, supplier_key,
-                 movement_type_key, quantity, unit_price, total_value, source_movement_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
+        facts.append((
             date_key,
             product_key,
             warehouse_key,
-            supplier_key,
-            movement_type_key,
+            key_caches["supplier"].get(supplier_id),
+            key_caches["movement_type"].get(movement_type),
             quantity,
             unit_price,
             total_value,
             mov_id
         ))
+    return facts
+
+
+def copy_rows(cur, table, columns, rows):
+    """
+    Передаём строки в таблицу одной командой COPY ... FROM STDIN (формат CSV).
+    None пишется как пустое поле и превращается в NULL.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=COPY_SPOOL_MAX_SIZE, mode="w+", newline="") as buf:
+        writer = csv.writer(buf)
+        writer.writerows(rows)
+        buf.seek(0)
+        cur.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buf,
+        )
+
+
+FACT_UPSERT_SET = """
+            SET product_key = EXCLUDED.product_key,
+                warehouse_key = EXCLUDED.warehouse_key,
+                supplier_key = EXCLUDED.supplier_key,
+                movement_type_key = EXCLUDED.movement_type_key,
+                quantity = EXCLUDED.quantity,
+                unit_price = EXCLUDED.unit_price,
+                total_value = EXCLUDED.total_value
+"""
+
+
+def load_facts_bulk(cur_dwh, facts, table="dwh.fact_inventory_movement"):
+    """
+    Массовая загрузка фактов: COPY во временную staging-таблицу
+    и один INSERT ... SELECT с upsert по (source_movement_id, date_key).
+    Возвращаем количество загруженных фактов.
+    """
+    cur_dwh.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS stage_fact_inventory_movement (
+            date_key           INTEGER,
+            product_key        INTEGER,
+            warehouse_key      INTEGER,
+            supplier_key       INTEGER,
+            movement_type_key  INTEGER,
+            quantity           INTEGER,
+            unit_price         NUMERIC(10,2),
+            total_value        NUMERIC(10,2),
+            source_movement_id INTEGER
+        ) ON COMMIT DROP
+    """)
+    cur_dwh.execute("TRUNCATE stage_fact_inventory_movement")
+    copy_rows(cur_dwh, "stage_fact_inventory_movement", FACT_COLUMNS, facts)
+
+    columns = ", ".join(FACT_COLUMNS)
+    cur_dwh.execute(f"""
+        INSERT INTO {table} ({columns})
+        SELECT {columns} FROM stage_fact_inventory_movement
+        ON CONFLICT (source_movement_id, date_key) DO UPDATE
+    """ + FACT_UPSERT_SET)
+    return cur_dwh.rowcount
+
 
+def load_facts_row_by_row(cur_dwh, facts, table="dwh.fact_inventory_movement"):
+    """
+    Построчная загрузка фактов (медленная, оставлена для отладки).
+    Возвращаем количество загруженных фактов.
+    """
+    for fact in facts:
+        cur_dwh.execute(f"""
+            INSERT INTO {table}
+                (date_key, product_key, warehouse_key, supplier_key,
+                 movement_type_key, quantity, unit_price, total_value, source_movement_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (source_movement_id, date_key) DO UPDATE
+        """ + FACT_UPSERT_SET, fact)
+    return len(facts)
+
+
+AGGREGATE_TABLES = (
+    "dwh.agg_daily_movement",
+    "dwh.agg_date_movement",
+    "dwh.agg_product_movement",
+    "dwh.agg_warehouse_movement",
+)
+
+
+def refresh_aggregates(cur_dwh, date_keys):
+    """
+    Пересчитываем агрегаты для затронутых дат.
+    agg_daily_movement и agg_date_movement для этих дат строятся заново из фактов,
+    а накопительные итоги по товарам и складам корректируются на разницу
+    (вычитаем старый вклад дат, прибавляем новый), без полного пересчёта.
+    """
+    date_keys = sorted(date_keys)
+    if not date_keys:
+        return
+    with telemetry.stage("aggregates") as st:
+        st["rows_in"] += len(date_keys)
+        update_aggregate_tables(cur_dwh, date_keys)
+    print(f"Агрегаты пересчитаны для дат: {len(date_keys)}")
+
+
+def update_aggregate_tables(cur_dwh, date_keys):
+    """
+    Дельта-обновление агрегатов для дат date_keys.
+    Сначала строки agg_daily_movement этих дат удаляются, и их суммы вычитаются из
+    накопительных agg_product_movement/agg_warehouse_movement; затем строки дат строятся
+    заново из фактов, и их суммы прибавляются обратно (agg_date_movement пересобирается).
+    Накопительные итоги верны, только если сюда попадает каждая дата, факты которой
+    изменились в запуске, включая даты, повторно загруженные upsert'ом после сбоя
+    параллельной загрузки: вклад пропущенной даты в итогах остался бы прежним.
+    """
+
+    # 1. Убираем старый вклад затронутых дат
+    cur_dwh.execute("""
+        WITH old AS (
+            DELETE FROM dwh.agg_daily_movement
+            WHERE date_key = ANY(%(keys)s)
+            RETURNING product_key, warehouse_key, quantity_sum, value_sum, movement_count
+        ),
+        upd_product AS (
+            UPDATE dwh.agg_product_movement a
+            SET quantity_sum = a.quantity_sum - o.quantity_sum,
+                value_sum = a.value_sum - o.value_sum,
+                movement_count = a.movement_count - o.movement_count
+            FROM (SELECT product_key, SUM(quantity_sum) AS quantity_sum,
+                         SUM(value_sum) AS value_sum, SUM(movement_count) AS movement_count
+                  FROM old GROUP BY product_key) o
+            WHERE a.product_key = o.product_key
+        ),
+        upd_warehouse AS (
+            UPDATE dwh.agg_warehouse_movement a
+            SET quantity_sum = a.quantity_sum - o.quantity_sum,
+                value_sum = a.value_sum - o.value_sum,
+                movement_count = a.movement_count - o.movement_count
+            FROM (SELECT warehouse_key, SUM(quantity_sum) AS quantity_sum,
+                         SUM(value_sum) AS value_sum, SUM(movement_count) AS movement_count
+                  FROM old GROUP BY warehouse_key) o
+            WHERE a.warehouse_key = o.warehouse_key
+        )
+        DELETE FROM dwh.agg_date_movement WHERE date_key = ANY(%(keys)s)
+    """, {"keys": date_keys})
+
+    # 2. Строим агрегаты затронутых дат из фактов и добавляем их вклад в итоги
+    cur_dwh.execute("""
+        WITH new AS (
+            INSERT INTO dwh.agg_daily_movement
+                (date_key, product_key, warehouse_key, movement_type_key,
+                 quantity_sum, value_sum, movement_count)
+            SELECT date_key, product_key, warehouse_key, movement_type_key,
+                   COALESCE(SUM(quantity), 0), COALESCE(SUM(total_value), 0), COUNT(*)
+            FROM dwh.fact_inventory_movement
+            WHERE date_key = ANY(%(keys)s)
+            GROUP BY date_key, product_key, warehouse_key, movement_type_key
+            RETURNING date_key, product_key, warehouse_key, quantity_sum, value_sum, movement_count
+        ),
+        ins_product AS (
+            INSERT INTO dwh.agg_product_movement (product_key, quantity_sum, value_sum, movement_count)
+            SELECT product_key, SUM(quantity_sum), SUM(value_sum), SUM(movement_count)
+            FROM new GROUP BY product_key
+            ON CONFLICT (product_key) DO UPDATE
+            SET quantity_sum = agg_product_movement.quantity_sum + EXCLUDED.quantity_sum,
+                value_sum = agg_product_movement.value_sum + EXCLUDED.value_sum,
+                movement_count = agg_product_movement.movement_count + EXCLUDED.movement_count
+        ),
+        ins_warehouse AS (
+            INSERT INTO dwh.agg_warehouse_movement (warehouse_key, quantity_sum, value_sum, movement_count)
+            SELECT warehouse_key, SUM(quantity_sum), SUM(value_sum), SUM(movement_count)
+            FROM new GROUP BY warehouse_key
+            ON CONFLICT (warehouse_key) DO UPDATE
+            SET quantity_sum = agg_warehouse_movement.quantity_sum + EXCLUDED.quantity_sum,
+                value_sum = agg_warehouse_movement.value_sum + EXCLUDED.value_sum,
+                movement_count = agg_warehouse_movement.movement_count + EXCLUDED.movement_count
+        )
+        INSERT INTO dwh.agg_date_movement (date_key, quantity_sum, value_sum, movement_count)
+        SELECT date_key, SUM(quantity_sum), SUM(value_sum), SUM(movement_count)
+        FROM new GROUP BY date_key
+    """, {"keys": date_keys})
+
+
+def rebuild_aggregates(cur_dwh):
+    """
+    Полное построение агрегатов по всей таблице фактов
+    (первичное заполнение или восстановление после ручных правок фактов).
+    """
+    cur_dwh.execute(f"TRUNCATE {', '.join(AGGREGATE_TABLES)}")
+    cur_dwh.execute("SELECT DISTINCT date_key FROM dwh.fact_inventory_movement")
+    refresh_aggregates(cur_dwh, [r[0] for r in cur_dwh.fetchall()])
+
+
+def load_movement_range(cur_oltp, cur_dwh, key_caches, last_id, max_id=None,
+                        bulk=True, chunk_size=DEFAULT_CHUNK_SIZE,
+                        date_from=None, date_to=None, table="dwh.fact_inventory_movement"):
+    """
+    Прогоняем движения с id в (last_id, max_id] (и датой в [date_from, date_to), если задано)
+    через конвейер extract -> transform -> load в таблицу table.
+    Возвращаем (обработано движений, загружено фактов, последний movement_id, максимальная дата,
+    множество затронутых date_key).
+    """
+    last_date = None
+    touched_dates = set()
+    chunks = extract_movements(cur_oltp, last_id, chunk_size, max_id, date_from, date_to)
+    extracted = loaded = 0
+    for rows_count, chunk_last_id, chunk_max_date, facts in transform_chunks(cur_dwh, chunks, key_caches):
+        # watermark двигаем по всем просмотренным строкам,
+        # иначе пропущенные строки перечитывались бы при каждом запуске
+        last_id = chunk_last_id
+        if chunk_max_date is not None and (last_date is None or chunk_max_date > last_date):
+            last_date = chunk_max_date
+
+        with telemetry.stage("load_facts") as st:
+            if bulk:
+                chunk_loaded = load_facts_bulk(cur_dwh, facts, table)
+            else:
+                chunk_loaded = load_facts_row_by_row(cur_dwh, facts, table)
+            st["rows_in"] += len(facts)
+            st["rows_out"] += chunk_loaded
+        loaded += chunk_loaded
+        extracted += rows_count
+        touched_dates.update(fact[0] for fact in facts)
+    return extracted, loaded, last_id, last_date, touched_dates
 
-def run_etl():
+
+def start_fact_load(cur_dwh, full_reload):
+    """
+    Начало загрузки фактов: очистка при полной перезагрузке либо чтение watermark.
+    Возвращаем (last_movement_id, last_movement_date), с которых продолжается загрузка.
+    """
+    if full_reload:
+        print("Очищаем таблицу фактов fact_inventory_movement...")
+        cur_dwh.execute("TRUNCATE dwh.fact_inventory_movement")
+        cur_dwh.execute(f"TRUNCATE {', '.join(AGGREGATE_TABLES)}")
+        set_watermark(cur_dwh, 0, None)
+        return 0, None
+    last_id, last_date = get_watermark(cur_dwh)
+    print(f"Инкрементальная загрузка с movement_id > {last_id}")
+    return last_id, last_date
+
+
+def load_fact_inventory_movements(cur_oltp, cur_dwh, full_reload=False, bulk=True, key_caches=None,
+                                  chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Загружаем таблицу фактов fact_inventory_movement.
+    full_reload=True: перед загрузкой очищаем таблицу фактов и грузим всё с нуля.
+    full_reload=False: грузим только движения с id больше сохранённого watermark,
+    повторная загрузка той же строки обновляет её (upsert по source_movement_id).
+    bulk=False: построчная загрузка вместо COPY (для отладки).
+    key_caches: кэши суррогатных ключей (если не переданы, загружаются здесь).
+    chunk_size: размер пачки extract -> transform -> load; определяет пиковый расход памяти.
+    """
+    if key_caches is None:
+        key_caches = load_key_caches(cur_dwh)
+
+    last_id, last_date = start_fact_load(cur_dwh, full_reload)
+
+    extracted, loaded, range_last_id, range_last_date, touched_dates = load_movement_range(
+        cur_oltp, cur_dwh, key_caches, last_id, bulk=bulk, chunk_size=chunk_size)
+    print(f"Обработано движений: {extracted}, загружено фактов: {loaded}")
+    refresh_aggregates(cur_dwh, touched_dates)
+
+    if extracted:
+        last_id = range_last_id
+        if range_last_date is not None and (last_date is None or range_last_date > last_date):
+            last_date = range_last_date
+    set_watermark(cur_dwh, last_id, last_date)
+
+
+def split_id_range(last_id, max_id, parts):
+    """
+    Делим диапазон id (last_id, max_id] на parts непересекающихся диапазонов (lo, hi].
+    """
+    step = max(1, -(-(max_id - last_id) // parts))
+    return [(lo, min(lo + step, max_id)) for lo in range(last_id, max_id, step)]
+
+
+def load_fact_partition(partition):
+    """
+    Рабочий процесс параллельной загрузки: свои соединения с OLTP и DWH,
+    свой кэш ключей и своя транзакция на диапазон id.
+    replace=True (полная перезагрузка): в той же транзакции сначала удаляются
+    прежние факты диапазона, так что диапазон заменяется целиком или не меняется вовсе.
+    """
+    lo, hi, bulk, chunk_size, replace = partition
+    telemetry.reset()
+    with closing(get_conn(OLTP_CONFIG)) as conn_oltp, \
+         closing(get_conn(DWH_CONFIG)) as conn_dwh:
+
+        with conn_oltp.cursor() as cur_oltp, conn_dwh.cursor() as cur_dwh:
+            if replace:
+                cur_dwh.execute("""
+                    DELETE FROM dwh.fact_inventory_movement
+                    WHERE source_movement_id > %s AND source_movement_id <= %s
+                """, (lo, hi))
+            key_caches = load_key_caches(cur_dwh)
+            extracted, loaded, _, last_date, touched_dates = load_movement_range(
+                cur_oltp, cur_dwh, key_caches, lo, hi, bulk=bulk, chunk_size=chunk_size)
+
+        conn_dwh.commit()
+        conn_oltp.commit()
+    print(f"Диапазон id ({lo}, {hi}]: обработано {extracted}, загружено {loaded}")
+    return extracted, loaded, last_date, touched_dates, telemetry.stages
+
+
+def load_fact_inventory_movements_parallel(cur_oltp, cur_dwh, workers, full_reload=False, bulk=True,
+                                           chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Параллельная загрузка фактов: диапазон новых id делится на workers частей,
+    каждая часть грузится в отдельном процессе и фиксируется своей транзакцией.
+    Watermark сдвигается и агрегаты пересчитываются только после успешной загрузки всех частей;
+    при сбое следующий запуск повторит весь диапазон (upsert делает это безопасным).
+    Полная перезагрузка не очищает таблицу фактов заранее: каждый процесс заменяет
+    свой диапазон id в своей транзакции, а факты движений, которых больше нет в OLTP,
+    удаляются в конце. При сбое части диапазонов остаются прежние факты, отчёты
+    не пустеют, а агрегаты перестраиваются по тому, что оказалось в таблице фактов.
+    Измерения должны быть загружены и зафиксированы до вызова.
+    """
+    if full_reload:
+        print("Полная перезагрузка фактов с заменой по диапазонам id")
+        last_id, last_date = 0, None
+    else:
+        last_id, last_date = start_fact_load(cur_dwh, full_reload)
+
+    cur_oltp.execute("SELECT max(id) FROM inventory_movement")
+    max_id = cur_oltp.fetchone()[0]
+    if max_id is None or max_id <= last_id:
+        print("Новых движений нет")
+        if full_reload:
+            # в OLTP нет движений: очистка в одной транзакции с вызывающим кодом
+            start_fact_load(cur_dwh, full_reload)
+        else:
+            set_watermark(cur_dwh, last_id, last_date)
+        return
+
+    # Календарь и секции расширяем заранее, чтобы рабочие процессы не делали этого параллельно
+    cur_oltp.execute("""
+        SELECT min(movement_date), max(movement_date)
+        FROM inventory_movement
+        WHERE id > %s AND id <= %s
+    """, (last_id, max_id))
+    min_date, max_date = cur_oltp.fetchone()
+    if min_date is not None:
+        extend_calendar(cur_dwh, min_date.date(), max_date.date())
+        ensure_fact_partitions(cur_dwh, min_date.date(), max_date.date())
+        cur_dwh.connection.commit()
+
+    partitions = [(lo, hi, bulk, chunk_size, full_reload)
+                  for lo, hi in split_id_range(last_id, max_id, workers)]
+    print(f"Параллельная загрузка: {len(partitions)} диапазонов id, процессов {workers}")
+    # spawn: рабочие процессы не наследуют открытые соединения родителя
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        try:
+            results = pool.map(load_fact_partition, partitions)
+        except Exception:
+            if full_reload:
+                # часть диапазонов уже заменена: агрегаты должны соответствовать фактам
+                rebuild_aggregates(cur_dwh)
+                cur_dwh.connection.commit()
+            raise
+
+    extracted = sum(r[0] for r in results)
+    loaded = sum(r[1] for r in results)
+    print(f"Обработано движений: {extracted}, загружено фактов: {loaded}")
+
+    touched_dates = set()
+    for _, _, part_last_date, part_dates, part_stages in results:
+        if part_last_date is not None and (last_date is None or part_last_date > last_date):
+            last_date = part_last_date
+        touched_dates |= part_dates
+        telemetry.merge(part_stages)
+    if full_reload:
+        cur_dwh.execute("DELETE FROM dwh.fact_inventory_movement WHERE source_movement_id > %s",
+                        (max_id,))
+        rebuild_aggregates(cur_dwh)
+    else:
+        refresh_aggregates(cur_dwh, touched_dates)
+    set_watermark(cur_dwh, max_id, last_date)
+
+
+def partition_index_names(cur_dwh, table):
+    """
+    Индексы секции table, привязанные к индексам секционированной таблицы:
+    {oid родительского индекса: имя индекса секции}.
+    """
+    cur_dwh.execute("""
+        SELECT i.inhparent, c.relname
+        FROM pg_index x
+        JOIN pg_class c ON c.oid = x.indexrelid
+        JOIN pg_inherits i ON i.inhrelid = x.indexrelid
+        WHERE x.indrelid = %s::regclass
+    """, (table,))
+    return dict(cur_dwh.fetchall())
+
+
+def reload_fact_month(cur_oltp, cur_dwh, month, key_caches, bulk=True, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Перезагрузка одного месяца фактов подменой секции:
+    месяц целиком грузится в новую таблицу, затем старая секция отсоединяется (DETACH)
+    и удаляется, а новая присоединяется (ATTACH) на её место.
+    Пока идёт загрузка, отчёты читают старую секцию; мёртвых строк не остаётся.
+    Индексы новой секции (и первичный ключ) получают имена индексов старой,
+    иначе после каждой перезагрузки в каталоге оставались бы имена с суффиксом _new.
+    """
+    month = month_start(month)
+    name = fact_partition_name(month)
+    lo, hi = date_key_of(month), date_key_of(next_month(month))
+    new_table = f"dwh.{name}_new"
+
+    ensure_fact_partitions(cur_dwh, month, month)
+    cur_dwh.execute(f"DROP TABLE IF EXISTS {new_table}")
+    cur_dwh.execute(f"CREATE TABLE {new_table} (LIKE dwh.fact_inventory_movement INCLUDING ALL)")
+    # CHECK с границами секции позволяет ATTACH не сканировать таблицу
+    cur_dwh.execute(f"""
+        ALTER TABLE {new_table}
+        ADD CONSTRAINT {name}_range CHECK (date_key >= {lo} AND date_key < {hi})
+    """)
+
+    print(f"Перезагружаем секцию {name}...")
+    extracted, loaded, _, _, _ = load_movement_range(
+        cur_oltp, cur_dwh, key_caches, 0, bulk=bulk, chunk_size=chunk_size,
+        date_from=month, date_to=next_month(month), table=new_table)
+    print(f"Обработано движений: {extracted}, загружено фактов: {loaded}")
+
+    index_names = partition_index_names(cur_dwh, f"dwh.{name}")
+    cur_dwh.execute(f"ALTER TABLE dwh.fact_inventory_movement DETACH PARTITION dwh.{name}")
+    cur_dwh.execute(f"DROP TABLE dwh.{name}")
+    cur_dwh.execute(f"ALTER TABLE {new_table} RENAME TO {name}")
+    cur_dwh.execute(f"""
+        ALTER TABLE dwh.fact_inventory_movement
+        ATTACH PARTITION dwh.{name} FOR VALUES FROM ({lo}) TO ({hi})
+    """)
+    cur_dwh.execute(f"ALTER TABLE dwh.{name} DROP CONSTRAINT {name}_range")
+    # переименование индекса первичного ключа переименовывает и сам ограничитель
+    for parent, index in partition_index_names(cur_dwh, f"dwh.{name}").items():
+        if parent in index_names and index != index_names[parent]:
+            cur_dwh.execute(f'ALTER INDEX dwh."{index}" RENAME TO "{index_names[parent]}"')
+
+    month_days = (next_month(month) - month).days
+    refresh_aggregates(cur_dwh, [date_key_of(month + timedelta(days=i)) for i in range(month_days)])
+
+
+def save_etl_run(conn_dwh, mode, status, error=None):
+    """
+    Записываем итог запуска в dwh.etl_run и выводим его одной JSON-строкой для логов.
+    """
+    finished_at = datetime.utcnow()
+    stages = telemetry.summary()
+    seconds = (finished_at - telemetry.started_at).total_seconds()
+    with conn_dwh.cursor() as cur:
+        cur.execute("""
+            INSERT INTO dwh.etl_run (started_at, finished_at, status, mode, seconds, stages, error)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            RETURNING run_id
+        """, (telemetry.started_at, finished_at, status, mode, seconds, Json(stages), error))
+        run_id = cur.fetchone()[0]
+    conn_dwh.commit()
+    print(json.dumps({
+        "event": "etl_run",
+        "run_id": run_id,
+        "status": status,
+        "mode": mode,
+        "started_at": telemetry.started_at.isoformat(),
+        "seconds": round(seconds, 3),
+        "stages": stages,
+        "error": error,
+    }, ensure_ascii=False))
+
+
+def print_profile():
+    print(f"{'Этап':<20}{'Время, с':>10}{'Вход':>12}{'Выход':>12}{'Отброшено':>12}{'Строк/с':>12}")
+    for st in telemetry.summary():
+        rate = st["rows_per_sec"] if st["rows_per_sec"] is not None else "-"
+        print(f"{st['stage']:<20}{st['seconds']:>10.3f}{st['rows_in']:>12}{st['rows_out']:>12}"
+              f"{st['rows_skipped']:>12}{rate:>12}")
+
+
+DIMENSION_LOADERS = (
+    ("dim_product", load_dim_products),
+    ("dim_warehouse", load_dim_warehouses),
+    ("dim_supplier", load_dim_suppliers),
+    ("dim_movement_type", ensure_movement_types),
+)
+
+
+def run_etl(full_reload=False, bulk=True, calendar_start=None, calendar_end=None,
+            chunk_size=DEFAULT_CHUNK_SIZE, workers=1, reload_month=None, rebuild_aggs=False,
+            profile=False):
     """
     Главная функция ETL-процесса:
-    1. Загружаем измерения.
-    2. Загружаем факты.
+    1. Загружаем измерения (включая календарь dim_date за [calendar_start, calendar_end]).
+    2. Загружаем факты (инкрементально или полностью при full_reload=True;
+       bulk=False включает построчную загрузку) пачками по chunk_size строк.
+    При workers > 1 измерения фиксируются отдельной транзакцией,
+    а факты грузятся параллельно в workers процессах.
+    reload_month: вместо загрузки новых движений перезагрузить этот месяц подменой секции.
+    rebuild_aggs: после загрузки фактов построить агрегаты отчётов заново по всей таблице фактов.
+    Метрики этапов сохраняются в dwh.etl_run; profile=True печатает их таблицей в конце.
     """
+    if calendar_start is None:
+        calendar_start = DEFAULT_CALENDAR_START
+    if calendar_end is None:
+        calendar_end = date(date.today().year + 1, 12, 31)
+
+    if reload_month is not None:
+        mode = f"reload_month {reload_month:%Y-%m}"
+    else:
+        mode = "full" if full_reload else "incremental"
+        if workers > 1:
+            mode += f" workers={workers}"
+    if not bulk:
+        mode += " row_by_row"
+
+    telemetry.reset()
     with closing(get_conn(OLTP_CONFIG)) as conn_oltp, \
          closing(get_conn(DWH_CONFIG)) as conn_dwh:
 
         conn_oltp.autocommit = False
         conn_dwh.autocommit = False
 
-        with conn_oltp.cursor() as cur_oltp, conn_dwh.cursor() as cur_dwh:
-            print("Загружаем измерения...")
-            load_dim_products(cur_oltp, cur_dwh)
-            load_dim_warehouses(cur_oltp, cur_dwh)
-            load_dim_suppliers(cur_oltp, cur_dwh)
-            ensure_movement_types(cur_oltp, cur_dwh)
+        try:
+            with conn_oltp.cursor() as cur_oltp, conn_dwh.cursor() as cur_dwh:
+                print("Загружаем измерения...")
+                for name, loader in DIMENSION_LOADERS:
+                    with telemetry.stage(name) as st:
+                        stats = loader(cur_oltp, cur_dwh)
+                        st["rows_in"] += stats["inserted"] + stats["updated"] + stats["unchanged"]
+                        st["rows_out"] += stats["inserted"] + stats["updated"]
+                        st["rows_skipped"] += stats["unchanged"]
+                    print_merge_stats(name, stats)
 
-            print("Загружаем факты...")
-            load_fact_inventory_movements(cur_oltp, cur_dwh, full_reload=True)
+                with telemetry.stage("calendar"):
+                    ensure_calendar(cur_dwh, calendar_start, calendar_end)
 
-        conn_dwh.commit()
-        conn_oltp.commit()
+                    partitions_until = month_start(date.today())
+                    for _ in range(PARTITIONS_AHEAD_MONTHS):
+                        partitions_until = next_month(partitions_until)
+                    ensure_fact_partitions(cur_dwh, month_start(date.today()), partitions_until)
+
+                print("Загружаем факты...")
+                if reload_month is not None:
+                    key_caches = load_key_caches(cur_dwh)
+                    reload_fact_month(cur_oltp, cur_dwh, reload_month, key_caches,
+                                      bulk=bulk, chunk_size=chunk_size)
+                    print_key_cache_stats(key_caches)
+                elif workers > 1:
+                    conn_dwh.commit()
+                    load_fact_inventory_movements_parallel(cur_oltp, cur_dwh, workers,
+                                                           full_reload=full_reload, bulk=bulk,
+                                                           chunk_size=chunk_size)
+                else:
+                    key_caches = load_key_caches(cur_dwh)
+                    load_fact_inventory_movements(cur_oltp, cur_dwh, full_reload=full_reload, bulk=bulk,
+                                                  key_caches=key_caches, chunk_size=chunk_size)
+                    print_key_cache_stats(key_caches)
+
+                if rebuild_aggs:
+                    print("Перестраиваем агрегаты отчётов...")
+                    rebuild_aggregates(cur_dwh)
+
+            conn_dwh.commit()
+            conn_oltp.commit()
+        except Exception as e:
+            conn_dwh.rollback()
+            conn_oltp.rollback()
+            try:
+                save_etl_run(conn_dwh, mode, "failed", error=str(e))
+            except Exception as log_error:
+                print(f"Не удалось записать запуск в dwh.etl_run: {log_error}")
+            raise
+
+        save_etl_run(conn_dwh, mode, "success")
         print("ETL завершён успешно.")
 
+    if profile:
+        print_profile()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ETL: OLTP warehouse_db -> DWH warehouse_dwh")
+    parser.add_argument("--full-reload", action="store_true",
+                        help="очистить таблицу фактов и загрузить все движения заново")
+    parser.add_argument("--row-by-row", action="store_true",
+                        help="построчная загрузка фактов вместо COPY (для отладки)")
+    parser.add_argument("--calendar-start", type=date.fromisoformat,
+                        help="начало календаря dim_date, YYYY-MM-DD (по умолчанию %(default)s)",
+                        default=DEFAULT_CALENDAR_START)
+    parser.add_argument("--calendar-end", type=date.fromisoformat,
+                        help="конец календаря dim_date, YYYY-MM-DD (по умолчанию конец следующего года)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="размер пачки движений при потоковой загрузке (по умолчанию %(default)s)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="число параллельных процессов загрузки фактов (по умолчанию %(default)s)")
+    parser.add_argument("--reload-month", type=lambda v: datetime.strptime(v, "%Y-%m").date(),
+                        help="перезагрузить один месяц фактов подменой секции, YYYY-MM")
+    parser.add_argument("--rebuild-aggregates", action="store_true",
+                        help="построить агрегаты отчётов заново по всей таблице фактов")
+    parser.add_argument("--profile", action="store_true",
+                        help="напечатать в конце время и число строк по этапам")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    run_etl()
+    args = parse_args()
+    run_etl(full_reload=args.full_reload, bulk=not args.row_by_row,
+            calendar_start=args.calendar_start, calendar_end=args.calendar_end,
+            chunk_size=args.chunk_size, workers=args.workers, reload_month=args.reload_month,
+            rebuild_aggs=args.rebuild_aggregates, profile=args.profile)
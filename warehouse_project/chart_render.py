@@ -0,0 +1,226 @@
+"""Рендеринг графиков отчетов matplotlib в пуле процессов.
+
+Рендеринг нагружает CPU и держит GIL, поэтому роуты не рисуют графики сами, а
+отправляют в пул спецификацию (id графика и простые данные) и ждут PNG с таймаутом.
+Модуль не зависит от Flask и БД: в пул передаются только его функции и простые данные.
+"""
+import io
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+
+def create_chart_png(fig):
+    """Рендерит график matplotlib в PNG"""
+    img = io.BytesIO()
+    fig.savefig(img, format='png', bbox_inches='tight', dpi=100)
+    return img.getvalue()
+
+def safe_tight_layout(fig):
+    """Безопасное использование tight_layout с обработкой ошибок"""
+    try:
+        fig.tight_layout()
+    except Exception:
+        fig.subplots_adjust(left=0.15, right=0.9, top=0.9, bottom=0.15)
+
+def render_category_chart(categories):
+    """Круговые диаграммы категорий по количеству и по стоимости"""
+    fig1, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+    try:
+        labels = [cat[0] for cat in categories]
+        
+        # Круговая диаграмма по количеству товаров
+        ax1.pie([cat[1] for cat in categories], labels=labels, autopct='%1.1f%%', startangle=90)
+        ax1.set_title('Распределение товаров по категориям (количество)', fontsize=14)
+        ax1.axis('equal')
+        
+        # Круговая диаграмма по стоимости
+        ax2.pie([cat[2] for cat in categories], labels=labels, autopct='%1.1f%%', startangle=90)
+        ax2.set_title('Распределение товаров по категориям (стоимость)', fontsize=14)
+        ax2.axis('equal')
+        
+        safe_tight_layout(fig1)
+        return create_chart_png(fig1)
+    finally:
+        plt.close(fig1)
+
+def render_warehouse_chart(warehouses):
+    """Столбчатая диаграмма заполненности складов"""
+    fig2, ax = plt.subplots(figsize=(12, 6))
+    try:
+        warehouse_names = [w[0] for w in warehouses]
+        capacities = [w[1] for w in warehouses]
+        colors = []
+        for capacity in capacities:
+            if capacity < 60:
+                colors.append('#28a745')  # зеленый
+            elif capacity < 80:
+                colors.append('#ffc107')  # желтый
+            else:
+                colors.append('#dc3545')  # красный
+        
+        bars = ax.bar(warehouse_names, capacities, color=colors, alpha=0.7)
+        ax.set_xlabel('Склады', fontsize=12)
+        ax.set_ylabel('Заполненность (%)', fontsize=12)
+        ax.set_title('Заполненность складов', fontsize=16, fontweight='bold')
+        ax.set_ylim(0, 100)
+        ax.grid(axis='y', alpha=0.3)
+        
+        # Добавляем значения на столбцы
+        for bar, val in zip(bars, capacities):
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height + 1,
+                   f'{val:.1f}%', ha='center', va='bottom', fontsize=10)
+        
+        safe_tight_layout(fig2)
+        return create_chart_png(fig2)
+    finally:
+        plt.close(fig2)
+
+def render_movement_chart(data):
+    """Линия нетто-оборота с заливкой положительных и отрицательных значений"""
+    fig3, ax = plt.subplots(figsize=(14, 6))
+    try:
+        date_labels = data['labels']
+        smoothed = data['values']
+        days = data.get('days', 30)
+        
+        if not date_labels:
+            ax.text(0.5, 0.5, f'Нет данных о движениях\nза последние {days} дней', 
+                    ha='center', va='center', fontsize=14)
+            ax.set_title('Динамика движений товаров', fontsize=16)
+        else:
+            x = range(len(date_labels))
+            
+            ax.plot(x, smoothed, color='#0d6efd', linewidth=3, 
+                marker='o', markersize=5, label='Нетто-оборот')
+            
+            ax.fill_between(x, smoothed, 0, 
+                        where=[v >= 0 for v in smoothed], 
+                        color='#28a745', alpha=0.3)
+            ax.fill_between(x, smoothed, 0, 
+                        where=[v < 0 for v in smoothed], 
+                        color='#dc3545', alpha=0.3)
+            
+            ax.set_xlabel('Дата', fontsize=12)
+            ax.set_ylabel('Нетто-оборот (ед.)', fontsize=12)
+            ax.set_title(f'Динамика движений товаров (последние {days} дней)', 
+                        fontsize=16, fontweight='bold')
+            
+            # Подписи дат
+            step = max(1, len(x) // 8)
+            ax.set_xticks(x[::step])
+            ax.set_xticklabels([date_labels[i] for i in x[::step]], rotation=45, ha='right')
+            
+            ax.legend()
+            ax.grid(True, alpha=0.2)
+            ax.axhline(y=0, color='black', linewidth=1, alpha=0.5)
+        
+        safe_tight_layout(fig3)
+        return create_chart_png(fig3)
+    finally:
+        plt.close(fig3)
+
+# id графика -> функция рендеринга (данные -> PNG)
+RENDERERS = {
+    'categories': render_category_chart,
+    'warehouses': render_warehouse_chart,
+    'movements': render_movement_chart
+}
+
+def render_chart(chart_id, data):
+    """Точка входа процесса пула: PNG графика по его данным"""
+    return RENDERERS[chart_id](data)
+
+def warm_up():
+    """Первый рендер в процессе: загрузка matplotlib и построение кэша шрифтов"""
+    fig, ax = plt.subplots(figsize=(2, 2))
+    try:
+        ax.plot([0, 1], [0, 1])
+        ax.set_title('Прогрев')
+        return len(create_chart_png(fig))
+    finally:
+        plt.close(fig)
+
+
+class ChartRenderError(Exception):
+    """График не удалось отрисовать (ошибка рендеринга или таймаут)"""
+
+
+class ChartRenderService:
+    """Пул процессов для рендеринга графиков.
+    
+    Пул создается при первом обращении или явно через start(), который еще и
+    прогревает процессы (повторные вызовы start() ничего не делают). Процессы
+    запускаются методом spawn: форк процесса Flask с открытыми соединениями к БД
+    небезопасен.
+    """
+    
+    def __init__(self, workers=2, timeout=10):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = None
+        self._started = False
+        self._lock = threading.Lock()
+    
+    @property
+    def started(self):
+        return self._started
+    
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+    
+    def start(self, block=False):
+        """Создает пул и прогревает каждый процесс (только при первом вызове)"""
+        with self._lock:
+            if self._started:
+                return []
+            self._started = True
+        executor = self._get_executor()
+        futures = [executor.submit(warm_up) for _ in range(self.workers)]
+        if block:
+            for future in futures:
+                future.result(timeout=self.timeout)
+        return futures
+    
+    def render_many(self, specs, timeout=None):
+        """Параллельный рендеринг {ключ: (chart_id, data)} -> {ключ: PNG}.
+        Таймаут общий на всю пачку."""
+        executor = self._get_executor()
+        timeout = timeout or self.timeout
+        futures = {key: executor.submit(render_chart, chart_id, data)
+                   for key, (chart_id, data) in specs.items()}
+        
+        _, not_done = wait(futures.values(), timeout=timeout)
+        if not_done:
+            for future in not_done:
+                future.cancel()
+            raise ChartRenderError(f"Рендеринг графиков не уложился в {timeout} с")
+        
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                raise ChartRenderError(f"Ошибка рендеринга графика {specs[key][0]}: {e}") from e
+        return results
+    
+    def render(self, chart_id, data, timeout=None):
+        """PNG одного графика"""
+        return self.render_many({chart_id: (chart_id, data)}, timeout)[chart_id]
+    
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            self._started = False
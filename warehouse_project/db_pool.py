@@ -0,0 +1,194 @@
+"""Пул соединений psycopg2 для прямых SQL-запросов приложения (OLTP и DWH).
+
+Соединения переиспользуются между запросами вместо подключения на каждый запрос.
+Пул потокобезопасен, держит от minconn до maxconn соединений (minconn
+открываются при первой выдаче), проверяет соединение при выдаче и закрывает
+простаивающие дольше idle_timeout.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolExhaustedError(Exception):
+    """Все соединения заняты и ни одно не освободилось за checkout_timeout"""
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений psycopg2.
+
+    getconn() выдает соединение (ждет освобождения не дольше checkout_timeout),
+    putconn() возвращает его в пул. Перед выдачей соединение проверяется запросом
+    SELECT 1, сломанные соединения заменяются новыми. При возврате незавершенная
+    транзакция откатывается.
+    """
+
+    def __init__(self, name, config, minconn=1, maxconn=10, idle_timeout=300,
+                 checkout_timeout=5):
+        self.name = name
+        self.config = config
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = deque()            # (соединение, время возврата)
+        self._in_use = 0                # выданные и резервируемые под подключение
+        self._filled = False            # minconn соединений уже открывались
+        # RLock: счетчики меняются и из методов, вызываемых под блокировкой
+        self._cond = threading.Condition(threading.RLock())
+        self._counters = {
+            'checkouts': 0,
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.config)
+        with self._cond:
+            self._counters['created'] += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._cond:
+            self._counters['discarded'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_alive(self, conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _prune_idle(self, now):
+        """Закрывает соединения, простаивающие дольше idle_timeout, сверх minconn"""
+        while (self._idle and len(self._idle) + self._in_use > self.minconn
+               and now - self._idle[0][1] > self.idle_timeout):
+            conn, _ = self._idle.popleft()
+            self._discard(conn)
+
+    def _fill(self):
+        """Открывает недостающие до minconn простаивающие соединения.
+        Ошибку подключения здесь не поднимаем: она повторится в getconn()"""
+        with self._cond:
+            missing = self.minconn - len(self._idle) - self._in_use
+            if missing <= 0:
+                return
+            # Места резервируются до подключения, чтобы не превысить maxconn
+            self._in_use += missing
+
+        opened = []
+        try:
+            for _ in range(missing):
+                opened.append(self._connect())
+        except psycopg2.Error:
+            pass
+        finally:
+            with self._cond:
+                self._in_use -= missing
+                now = time.monotonic()
+                self._idle.extend((conn, now) for conn in opened)
+                self._cond.notify_all()
+
+    def getconn(self):
+        if not self._filled:
+            self._filled = True
+            self._fill()
+
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            self._prune_idle(time.monotonic())
+            while not self._idle and self._in_use >= self.maxconn:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolExhaustedError(
+                        f"Пул {self.name}: все {self.maxconn} соединений заняты"
+                    )
+                self._counters['waits'] += 1
+                self._cond.wait(remaining)
+
+            conn = self._idle.pop()[0] if self._idle else None
+            # Место в пуле резервируется до подключения, чтобы не превысить maxconn
+            self._in_use += 1
+
+        try:
+            reused = conn is not None and self._is_alive(conn)
+            if not reused:
+                if conn is not None:
+                    self._discard(conn)
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._counters['checkouts'] += 1
+            if reused:
+                self._counters['reused'] += 1
+        return conn
+
+    def putconn(self, conn, close=False):
+        keep = not close and not conn.closed
+        if keep:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                keep = False
+
+        with self._cond:
+            self._in_use -= 1
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Соединение на время блока with; при исключении транзакция откатывается"""
+        conn = self.getconn()
+        try:
+            yield conn
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            in_use = self._in_use
+            return dict(self._counters,
+                        name=self.name,
+                        minconn=self.minconn,
+                        maxconn=self.maxconn,
+                        idle=len(self._idle),
+                        in_use=in_use,
+                        utilization=in_use / self.maxconn if self.maxconn else 0)
@@ -0,0 +1,324 @@
+"""Версионные миграции схемы OLTP-базы warehouse_db.
+
+Каждая миграция применяется один раз, номер примененной версии хранится в
+schema_migrations. Индексы для рабочих запросов строятся через
+CREATE INDEX CONCURRENTLY, чтобы не блокировать запись в таблицы.
+
+Запуск:
+    python migrations.py            # применить новые миграции
+    python migrations.py --check    # проверить планы горячих запросов (EXPLAIN)
+"""
+import argparse
+import json
+import psycopg2
+from contextlib import closing
+
+DB_CONFIG = {
+    "host": "localhost",
+    "database": "warehouse_db",
+    "user": "postgres",
+    "password": "postgres",
+    "port": 5432,
+}
+
+# Конфигурация полнотекстового поиска; должна совпадать с SEARCH_TS_CONFIG в app.py
+SEARCH_TS_CONFIG = "simple"
+
+
+INITIAL_SCHEMA = [
+    # Таблица складов
+    """
+        CREATE TABLE IF NOT EXISTS warehouse (
+            id SERIAL PRIMARY KEY,
+            code VARCHAR(20) UNIQUE NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            location VARCHAR(200),
+            max_capacity INTEGER DEFAULT 10000,
+            current_capacity INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    # Таблица категорий
+    """
+        CREATE TABLE IF NOT EXISTS category (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(100) UNIQUE NOT NULL,
+            description TEXT
+        )
+    """,
+    # Таблица поставщиков
+    """
+        CREATE TABLE IF NOT EXISTS supplier (
+            id SERIAL PRIMARY KEY,
+            code VARCHAR(20) UNIQUE,
+            name VARCHAR(200) NOT NULL,
+            contact_person VARCHAR(100),
+            phone VARCHAR(50),
+            email VARCHAR(100),
+            address TEXT,
+            rating NUMERIC(3,1) DEFAULT 5.0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    # Таблица товаров
+    """
+        CREATE TABLE IF NOT EXISTS product (
+            id SERIAL PRIMARY KEY,
+            sku VARCHAR(50) UNIQUE NOT NULL,
+            name VARCHAR(200) NOT NULL,
+            description TEXT,
+            category_id INTEGER REFERENCES category(id),
+            category VARCHAR(100),
+            unit_price NUMERIC(10,2) DEFAULT 0.00,
+            cost_price NUMERIC(10,2) DEFAULT 0.00,
+            quantity INTEGER DEFAULT 0,
+            min_quantity INTEGER DEFAULT 10,
+            max_quantity INTEGER DEFAULT 100,
+            warehouse_id INTEGER REFERENCES warehouse(id),
+            supplier_id INTEGER REFERENCES supplier(id),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    # Таблица движений товаров
+    """
+        CREATE TABLE IF NOT EXISTS inventory_movement (
+            id SERIAL PRIMARY KEY,
+            product_id INTEGER REFERENCES product(id) NOT NULL,
+            warehouse_id INTEGER REFERENCES warehouse(id) NOT NULL,
+            movement_type VARCHAR(50) NOT NULL,
+            quantity INTEGER NOT NULL,
+            unit_price NUMERIC(10,2),
+            total_value NUMERIC(10,2),
+            document_number VARCHAR(100),
+            reference VARCHAR(200),
+            movement_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            notes TEXT,
+            created_by VARCHAR(100)
+        )
+    """,
+]
+
+SEARCH_SCHEMA = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"""
+        ALTER TABLE product ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(sku, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(description, '')), 'C')
+        ) STORED
+    """,
+]
+
+# Индексы поиска: GIN по tsvector товаров и pg_trgm GIN для ILIKE '%q%'
+SEARCH_INDEXES = [
+    ("idx_product_search_vector", "product USING gin (search_vector)"),
+] + [
+    (f"idx_{table}_{column}_trgm", f"{table} USING gin ({column} gin_trgm_ops)")
+    for table, columns in (
+        ("product", ("name", "sku", "description")),
+        ("warehouse", ("name", "code", "location")),
+        ("supplier", ("name", "code", "contact_person")),
+    )
+    for column in columns
+]
+
+# Индексы под запросы роутов: keyset-пагинация журнала движений и товаров,
+# фильтры списков, товары с низким запасом и отчеты за период
+HOT_QUERY_INDEXES = [
+    ("idx_movement_date_id",
+     "inventory_movement (movement_date DESC, id DESC)"),
+    ("idx_movement_product_date",
+     "inventory_movement (product_id, movement_date DESC, id DESC)"),
+    ("idx_movement_warehouse_date",
+     "inventory_movement (warehouse_id, movement_date DESC, id DESC)"),
+    ("idx_movement_type_date",
+     "inventory_movement (movement_type, movement_date DESC, id DESC)"),
+    ("idx_product_name_id",
+     "product (name, id)"),
+    ("idx_product_warehouse_name",
+     "product (warehouse_id, name, id)"),
+    ("idx_product_category_name",
+     "product (category, name, id)"),
+    ("idx_product_supplier",
+     "product (supplier_id)"),
+    ("idx_product_created_at",
+     "product (created_at)"),
+    ("idx_product_low_stock",
+     "product (quantity) WHERE quantity <= min_quantity"),
+]
+
+# (версия, описание, SQL-команды в одной транзакции, индексы для CONCURRENTLY)
+MIGRATIONS = [
+    (1, "Начальная схема", INITIAL_SCHEMA, []),
+    (2, "Индексы поиска pg_trgm и tsvector", SEARCH_SCHEMA, SEARCH_INDEXES),
+    (3, "Индексы горячих запросов", [], HOT_QUERY_INDEXES),
+]
+
+# Горячие запросы роутов для проверки планов; значения параметров условные
+HOT_QUERIES = {
+    "movements: страница журнала":
+        "SELECT id FROM inventory_movement ORDER BY movement_date DESC, id DESC LIMIT 21",
+    "movements: фильтр по товару":
+        "SELECT id FROM inventory_movement WHERE product_id = 1 "
+        "ORDER BY movement_date DESC, id DESC LIMIT 21",
+    "movements: фильтр по складу":
+        "SELECT id FROM inventory_movement WHERE warehouse_id = 1 "
+        "ORDER BY movement_date DESC, id DESC LIMIT 21",
+    "movements: фильтр по типу":
+        "SELECT id FROM inventory_movement WHERE movement_type = 'in' "
+        "ORDER BY movement_date DESC, id DESC LIMIT 21",
+    "daily report: движения за день":
+        "SELECT count(*) FROM inventory_movement "
+        "WHERE movement_date >= current_date AND movement_date < current_date + 1",
+    "products: страница каталога":
+        "SELECT id FROM product ORDER BY name, id LIMIT 21",
+    "products: фильтр по складу":
+        "SELECT id FROM product WHERE warehouse_id = 1 ORDER BY name, id LIMIT 21",
+    "products: фильтр по категории":
+        "SELECT id FROM product WHERE category = 'Электроника' ORDER BY name, id LIMIT 21",
+    "products: товары поставщика":
+        "SELECT id FROM product WHERE supplier_id = 1",
+    "products: низкий запас":
+        "SELECT id FROM product WHERE quantity <= min_quantity ORDER BY quantity LIMIT 20",
+    "search: подстрока в названии":
+        "SELECT id FROM product WHERE name ILIKE '%ноутбук%'",
+    "search: полнотекстовый поиск":
+        f"SELECT id FROM product "
+        f"WHERE search_vector @@ websearch_to_tsquery('{SEARCH_TS_CONFIG}', 'ноутбук')",
+}
+
+
+def get_conn(cfg=DB_CONFIG):
+    return psycopg2.connect(**cfg)
+
+
+def ensure_migrations_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description VARCHAR(200) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    conn.commit()
+
+
+def get_applied_versions(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cur.fetchall()}
+
+
+def create_index_concurrently(conn, name, definition):
+    """CREATE INDEX CONCURRENTLY вне транзакции.
+
+    Если прошлая попытка прервалась, от нее остается невалидный индекс,
+    который IF NOT EXISTS пропустил бы, поэтому такой индекс удаляется заранее.
+    """
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT NOT i.indisvalid
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = %s
+            """, (name,))
+            row = cur.fetchone()
+            if row and row[0]:
+                print(f"  ⚠️ Индекс {name} невалиден, пересоздаем")
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+    finally:
+        conn.autocommit = autocommit
+
+
+def apply_migrations(conn):
+    """Применяет миграции, которых еще нет в schema_migrations. Возвращает список версий."""
+    ensure_migrations_table(conn)
+    applied = get_applied_versions(conn)
+    newly_applied = []
+
+    for version, description, statements, indexes in MIGRATIONS:
+        if version in applied:
+            continue
+
+        print(f"Миграция {version}: {description}")
+        with conn.cursor() as cur:
+            for statement in statements:
+                cur.execute(statement)
+        conn.commit()
+
+        for name, definition in indexes:
+            create_index_concurrently(conn, name, definition)
+            print(f"  индекс {name}")
+
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+        conn.commit()
+        newly_applied.append(version)
+
+    if newly_applied:
+        print(f"✅ Применены миграции: {', '.join(map(str, newly_applied))}")
+    else:
+        print("✅ Схема актуальна")
+    return newly_applied
+
+
+def plan_index_nodes(plan):
+    """Узлы плана EXPLAIN, читающие индекс: [(тип узла, имя индекса)]"""
+    nodes = []
+    if "Index Name" in plan:
+        nodes.append((plan["Node Type"], plan["Index Name"]))
+    for child in plan.get("Plans", []):
+        nodes.extend(plan_index_nodes(child))
+    return nodes
+
+
+def check_query_plans(conn, queries=HOT_QUERIES):
+    """Проверяет через EXPLAIN, что каждый горячий запрос может читать индекс.
+
+    На маленьких таблицах планировщик предпочтет последовательное чтение, поэтому
+    проверка выполняется с enable_seqscan = off: она показывает, есть ли подходящий
+    индекс, а не выбор плана на текущем объеме данных. Возвращает True, если все запросы
+    используют индекс.
+    """
+    ok = True
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for name, sql in queries.items():
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            nodes = plan_index_nodes(plan[0]["Plan"])
+            if nodes:
+                used = ", ".join(f"{index} ({node_type})" for node_type, index in nodes)
+                print(f"✅ {name}: {used}")
+            else:
+                ok = False
+                print(f"❌ {name}: индекс не используется")
+    conn.rollback()
+    return ok
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Миграции схемы warehouse_db")
+    parser.add_argument("--check", action="store_true",
+                        help="проверить через EXPLAIN, что горячие запросы используют индексы")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with closing(get_conn()) as conn:
+        if args.check:
+            raise SystemExit(0 if check_query_plans(conn) else 1)
+        apply_migrations(conn)
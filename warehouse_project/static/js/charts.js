@@ -33,6 +33,9 @@ document.addEventListener('DOMContentLoaded', function() {
         }, false);
     });
     
+    // Графики отчетов по данным /api/reports/...
+    refreshReportCharts();
+    
     // Динамическое обновление времени
     updateClock();
     setInterval(updateClock, 60000); // Обновлять каждую минуту
@@ -213,6 +216,126 @@ function createChart(ctx, type, data, options = {}) {
     });
 }
 
+// Графики отчетов, отрисованные в браузере (id canvas -> Chart)
+const reportCharts = {};
+
+const REPORT_PALETTE = [
+    '#0d6efd', '#198754', '#ffc107', '#dc3545', '#6f42c1',
+    '#20c997', '#fd7e14', '#0dcaf0', '#6c757d'
+];
+
+// Цвет заполненности склада: зеленый до 60%, желтый до 80%, дальше красный
+function capacityColor(percent) {
+    if (percent < 60) return '#28a745';
+    if (percent < 80) return '#ffc107';
+    return '#dc3545';
+}
+
+// Построение конфигурации графика по ряду из API: {labels, values, ...}
+const reportChartBuilders = {
+    'categories-count': data => ({
+        type: 'pie',
+        data: {
+            labels: data.labels,
+            datasets: [{ data: data.counts, backgroundColor: REPORT_PALETTE }]
+        },
+        options: { plugins: { legend: { position: 'bottom' }, title: { display: true, text: 'По количеству' } } }
+    }),
+    'categories-value': data => ({
+        type: 'pie',
+        data: {
+            labels: data.labels,
+            datasets: [{ data: data.values, backgroundColor: REPORT_PALETTE }]
+        },
+        options: { plugins: { legend: { position: 'bottom' }, title: { display: true, text: 'По стоимости' } } }
+    }),
+    'warehouses': data => ({
+        type: 'bar',
+        data: {
+            labels: data.labels,
+            datasets: [{
+                label: 'Заполненность (%)',
+                data: data.values,
+                backgroundColor: data.values.map(capacityColor)
+            }]
+        },
+        options: { scales: { y: { min: 0, max: 100 } } }
+    }),
+    'movements': data => ({
+        type: 'line',
+        data: {
+            labels: data.labels,
+            datasets: [{
+                label: 'Нетто-оборот',
+                data: data.values,
+                borderColor: '#0d6efd',
+                fill: { target: 'origin', above: 'rgba(40, 167, 69, 0.3)', below: 'rgba(220, 53, 69, 0.3)' },
+                tension: 0.3
+            }]
+        }
+    }),
+    'dwh-top-products': data => ({
+        type: 'bar',
+        data: {
+            labels: data.labels,
+            datasets: [{ label: 'Стоимость движений (₽)', data: data.values, backgroundColor: '#0d6efd' }]
+        },
+        options: { indexAxis: 'y' }
+    }),
+    'dwh-warehouse-activity': data => ({
+        type: 'bar',
+        data: {
+            labels: data.labels,
+            datasets: [{ label: 'Количество', data: data.values, backgroundColor: '#198754' }]
+        }
+    }),
+    'dwh-movement-trend': data => ({
+        type: 'line',
+        data: {
+            labels: data.labels,
+            datasets: [{ label: 'Нетто-движение', data: data.values, borderColor: '#ffc107', tension: 0.3 }]
+        }
+    })
+};
+
+// Отрисовка или обновление графика на canvas с data-report-chart
+function renderReportChart(canvas, data) {
+    const builder = reportChartBuilders[canvas.dataset.reportChart];
+    if (!builder) return;
+    
+    const series = canvas.dataset.series ? data[canvas.dataset.series] : data;
+    if (!series) return;
+    
+    const config = builder(series);
+    const chart = reportCharts[canvas.id];
+    if (chart) {
+        chart.data = config.data;
+        chart.update();
+    } else {
+        reportCharts[canvas.id] = createChart(canvas.getContext('2d'), config.type, config.data, config.options || {});
+    }
+}
+
+// Загрузка данных одного графика
+function loadReportChart(canvas) {
+    updateData(canvas.dataset.url, data => renderReportChart(canvas, data));
+}
+
+// Загрузка данных всех графиков страницы; один запрос на каждый URL
+function refreshReportCharts() {
+    const groups = {};
+    document.querySelectorAll('canvas[data-report-chart]').forEach(canvas => {
+        const url = canvas.dataset.url;
+        (groups[url] = groups[url] || []).push(canvas);
+    });
+    
+    Object.entries(groups).forEach(([url, canvases]) => {
+        updateData(url, data => {
+            canvases.forEach(canvas => renderReportChart(canvas, data));
+        });
+    });
+}
+
 // Глобальные слушатели событий
 document.addEventListener('click', function(e) {
     // Обработка кликов на ссылках с подтверждением
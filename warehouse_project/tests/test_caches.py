@@ -0,0 +1,162 @@
+"""Кэш агрегатов (TTL, LRU, версия) и байтовый LRU-кэш графиков из app.py"""
+import threading
+
+import pytest
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(app_module, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app_module.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def cache(app_module, clock):
+    return app_module.AggregateCache(ttl=30, max_entries=3)
+
+
+def computed(value, calls):
+    def compute():
+        calls.append(value)
+        return value
+    return compute
+
+
+def test_value_is_computed_once_within_ttl(cache, clock):
+    calls = []
+    assert cache.get_or_compute('a', computed(1, calls)) == 1
+    clock.now += 29
+    assert cache.get_or_compute('a', computed(2, calls)) == 1
+    assert calls == [1]
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_entry_expires_after_ttl(cache, clock):
+    calls = []
+    cache.get_or_compute('a', computed(1, calls))
+    clock.now += 30
+    assert cache.get_or_compute('a', computed(2, calls)) == 2
+    assert calls == [1, 2]
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    calls = []
+    for key in 'abc':
+        cache.get_or_compute(key, computed(key, calls))
+    cache.get_or_compute('a', computed('a2', calls))   # 'a' становится самой свежей
+    cache.get_or_compute('d', computed('d', calls))    # вытесняется 'b'
+
+    assert cache.stats()['entries'] == 3
+    assert cache.get_or_compute('a', computed('a3', calls)) == 'a'
+    assert cache.get_or_compute('b', computed('b2', calls)) == 'b2'
+
+
+def test_invalidate_drops_entries(cache):
+    calls = []
+    cache.get_or_compute('a', computed(1, calls))
+    cache.invalidate()
+    assert cache.stats()['version'] == 1
+    assert cache.stats()['entries'] == 0
+    assert cache.get_or_compute('a', computed(2, calls)) == 2
+
+
+def test_value_computed_before_invalidate_is_not_stored(cache):
+    """Значение, посчитанное по данным до invalidate(), не должно попасть в кэш"""
+    calls = []
+
+    def stale():
+        cache.invalidate()
+        return 'stale'
+
+    assert cache.get_or_compute('a', stale) == 'stale'
+    assert cache.get_or_compute('a', computed('fresh', calls)) == 'fresh'
+    assert calls == ['fresh']
+
+
+def test_concurrent_readers_get_the_same_value(cache):
+    results = []
+
+    def worker():
+        results.append(cache.get_or_compute('a', lambda: 42))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [42] * 8
+    stats = cache.stats()
+    assert stats['hits'] + stats['misses'] == 8
+
+
+def test_cached_aggregate_keys_by_arguments_and_source(app_module, monkeypatch):
+    cache = app_module.AggregateCache(ttl=30, max_entries=10)
+    monkeypatch.setattr(app_module, 'aggregate_cache', cache)
+    calls = []
+
+    @app_module.cached_aggregate
+    def report(day):
+        calls.append(day)
+        return {'day': day}
+
+    assert report(1) == {'day': 1}
+    assert report(1) == {'day': 1}
+    assert report(2) == {'day': 2}
+    assert calls == [1, 2]
+
+    # те же аргументы, прочитанные с реплики, - отдельная запись
+    monkeypatch.setattr(app_module, 'reads_from_replica', lambda: True)
+    assert report(1) == {'day': 1}
+    assert calls == [1, 2, 1]
+
+
+@pytest.fixture
+def charts(app_module):
+    return app_module.ChartCache(max_bytes=10)
+
+
+def test_chart_cache_round_trip(charts):
+    assert charts.get('category', 'f1') is None
+    charts.put('category', 'f1', b'1234')
+    assert charts.get('category', 'f1') == b'1234'
+    assert charts.get('category', 'f2') is None
+    stats = charts.stats()
+    assert (stats['entries'], stats['bytes'], stats['hits'], stats['misses']) == (1, 4, 1, 2)
+
+
+def test_chart_cache_evicts_by_bytes_in_lru_order(charts):
+    charts.put('a', 'f', b'1234')
+    charts.put('b', 'f', b'1234')
+    charts.get('a', 'f')                # 'a' становится самой свежей
+    charts.put('c', 'f', b'1234')       # 12 байт > 10: вытесняется 'b'
+
+    assert charts.get('b', 'f') is None
+    assert charts.get('a', 'f') == b'1234'
+    assert charts.get('c', 'f') == b'1234'
+    assert charts.stats()['bytes'] == 8
+
+
+def test_chart_cache_replacing_entry_keeps_size(charts):
+    charts.put('a', 'f', b'1234')
+    charts.put('a', 'f', b'123456')
+    assert charts.stats()['bytes'] == 6
+    assert charts.stats()['entries'] == 1
+
+
+def test_chart_larger_than_cache_is_not_stored(charts):
+    charts.put('a', 'f', b'1234')
+    charts.put('big', 'f', b'x' * 11)
+
+    assert charts.get('big', 'f') is None
+    assert charts.get('a', 'f') == b'1234'
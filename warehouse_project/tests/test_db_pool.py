@@ -0,0 +1,241 @@
+"""Пул соединений db_pool.ConnectionPool на поддельных соединениях psycopg2"""
+import threading
+
+import pytest
+
+db_pool = pytest.importorskip('db_pool')
+extensions = db_pool.extensions
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        if self.conn.broken:
+            raise db_pool.psycopg2.OperationalError('server closed the connection')
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.autocommit = False
+        self.in_transaction = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = 1
+
+    def get_transaction_status(self):
+        if self.in_transaction:
+            return extensions.TRANSACTION_STATUS_INTRANS
+        return extensions.TRANSACTION_STATUS_IDLE
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Все соединения, открытые пулом"""
+    opened = []
+
+    def connect(**config):
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(db_pool.psycopg2, 'connect', connect)
+    return opened
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(db_pool.time, 'monotonic', clock)
+    return clock
+
+
+def make_pool(**kwargs):
+    options = dict(minconn=0, maxconn=2, idle_timeout=300, checkout_timeout=0.05)
+    options.update(kwargs)
+    return db_pool.ConnectionPool('test', {}, **options)
+
+
+def test_returned_connection_is_reused(connections):
+    pool = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    assert pool.getconn() is conn
+    stats = pool.stats()
+    assert (stats['created'], stats['reused'], stats['checkouts']) == (1, 1, 2)
+    assert stats['in_use'] == 1
+
+
+def test_minconn_connections_are_opened_on_first_checkout(connections):
+    pool = make_pool(minconn=2, maxconn=4)
+    conn = pool.getconn()
+
+    assert len(connections) == 2
+    assert conn in connections
+    assert pool.stats()['idle'] == 1
+    assert pool.stats()['in_use'] == 1
+
+
+def test_exhausted_pool_times_out(connections):
+    pool = make_pool()
+    pool.getconn()
+    pool.getconn()
+
+    with pytest.raises(db_pool.PoolExhaustedError):
+        pool.getconn()
+    stats = pool.stats()
+    assert stats['timeouts'] == 1
+    assert stats['waits'] >= 1
+    assert stats['utilization'] == 1
+    assert len(connections) == 2
+
+
+def test_waiting_checkout_gets_released_connection(connections):
+    pool = make_pool(maxconn=1, checkout_timeout=5)
+    conn = pool.getconn()
+    got = []
+
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    pool.putconn(conn)
+    waiter.join(5)
+
+    assert got == [conn]
+    assert len(connections) == 1
+
+
+def test_broken_connection_is_replaced(connections):
+    pool = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.broken = True
+
+    fresh = pool.getconn()
+    assert fresh is not conn
+    assert conn.closed
+    stats = pool.stats()
+    assert (stats['created'], stats['discarded'], stats['reused']) == (2, 1, 0)
+
+
+def test_putconn_rolls_back_open_transaction(connections):
+    pool = make_pool()
+    conn = pool.getconn()
+    conn.in_transaction = True
+    conn.autocommit = True
+    pool.putconn(conn)
+
+    assert conn.rollbacks == 1
+    assert conn.autocommit is False
+    assert pool.stats()['idle'] == 1
+
+
+def test_closed_connection_is_not_returned_to_pool(connections):
+    pool = make_pool()
+    conn = pool.getconn()
+    conn.close()
+    pool.putconn(conn)
+
+    stats = pool.stats()
+    assert (stats['idle'], stats['in_use'], stats['discarded']) == (0, 0, 1)
+
+
+def test_connection_block_rolls_back_on_error(connections):
+    pool = make_pool()
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            raise RuntimeError('ошибка в запросе')
+
+    assert conn.rollbacks >= 1
+    assert pool.stats()['in_use'] == 0
+    assert pool.stats()['idle'] == 1
+
+
+def test_failed_connect_releases_reserved_slot(monkeypatch):
+    def connect(**config):
+        raise db_pool.psycopg2.OperationalError('connection refused')
+
+    monkeypatch.setattr(db_pool.psycopg2, 'connect', connect)
+    pool = make_pool(minconn=1, maxconn=1)
+
+    for _ in range(2):
+        with pytest.raises(db_pool.psycopg2.OperationalError):
+            pool.getconn()
+    assert pool.stats()['in_use'] == 0
+
+
+def test_idle_connections_above_minconn_are_closed(connections, clock):
+    pool = make_pool(minconn=1, maxconn=3, idle_timeout=300)
+    first, second = pool.getconn(), pool.getconn()
+    pool.putconn(first)
+    pool.putconn(second)
+
+    clock.now += 301
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    # одно соединение закрыто как простаивающее, второе осталось ради minconn
+    assert first.closed
+    assert conn is second
+    stats = pool.stats()
+    assert (stats['idle'], stats['discarded']) == (1, 1)
+
+
+def test_closeall(connections):
+    pool = make_pool()
+    conns = [pool.getconn(), pool.getconn()]
+    for conn in conns:
+        pool.putconn(conn)
+    pool.closeall()
+
+    assert all(conn.closed for conn in conns)
+    assert pool.stats()['idle'] == 0
+
+
+def test_counters_are_consistent_under_concurrency(connections):
+    pool = make_pool(minconn=2, maxconn=3, checkout_timeout=5)
+
+    def worker():
+        for _ in range(200):
+            with pool.connection():
+                pass
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = pool.stats()
+    assert stats['checkouts'] == 1600
+    assert stats['created'] == len(connections) <= 3
+    # каждая выдача - либо повторное использование, либо новое соединение;
+    # сверх выдач открыты только соединения minconn при первой выдаче
+    assert stats['reused'] + stats['created'] - stats['checkouts'] in range(0, 3)
+    assert stats['in_use'] == 0
+    assert stats['timeouts'] == 0
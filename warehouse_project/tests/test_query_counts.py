@@ -0,0 +1,49 @@
+"""Потолки числа SQL-запросов на основных страницах.
+
+Страницы загружают связанные объекты через joinedload/contains_eager; если в шаблоне
+снова появится ленивая загрузка (N+1), число запросов превысит потолок.
+Кэш агрегатов очищается перед каждой проверкой, чтобы считались и его запросы.
+"""
+from contextlib import contextmanager
+
+import pytest
+
+event = pytest.importorskip('sqlalchemy').event
+
+# Потолки с небольшим запасом не ставятся: любой лишний запрос на странице — регрессия
+QUERY_CEILINGS = {
+    '/': 11,
+    '/products': 5,
+    '/movements': 5,
+    '/search?q=Ноутбук': 3,
+}
+
+
+@contextmanager
+def count_queries(db):
+    """Считает выполненные SQL-команды на всех движках приложения (включая реплику)"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@pytest.mark.parametrize('url, ceiling', QUERY_CEILINGS.items())
+def test_page_query_count(warehouse_app, client, url, ceiling):
+    with warehouse_app.app.app_context():
+        warehouse_app.aggregate_cache.invalidate()
+        with count_queries(warehouse_app.db) as statements:
+            response = client.get(url)
+
+    # при ошибке роуты делают flash и редирект, поэтому проверяем именно 200
+    assert response.status_code == 200
+    assert len(statements) <= ceiling, '\n\n'.join(statements)
@@ -0,0 +1,78 @@
+"""Маршрутизация чтения на реплику на двух базах.
+
+Запускается, когда кроме TEST_DATABASE_URL задан REPLICA_DATABASE_URL (вторая база
+с той же схемой). Запросы считаются отдельно для основной БД и для реплики.
+"""
+import time
+from contextlib import contextmanager
+
+import pytest
+
+event = pytest.importorskip('sqlalchemy').event
+
+
+@pytest.fixture(scope='module')
+def replica_app(warehouse_app):
+    replica_url = warehouse_app.app.config.get('SQLALCHEMY_BINDS', {}).get('replica')
+    if not replica_url:
+        pytest.skip('REPLICA_DATABASE_URL не задан')
+    psycopg2 = pytest.importorskip('psycopg2')
+    from migrations import apply_migrations
+
+    conn = psycopg2.connect(replica_url)
+    try:
+        apply_migrations(conn)
+    finally:
+        conn.close()
+    return warehouse_app
+
+
+@contextmanager
+def queries_by_database(db):
+    """{'primary': [...], 'replica': [...]} — SQL-команды, выполненные на каждой базе"""
+    statements = {'primary': [], 'replica': []}
+    engines = {'primary': db.engine, 'replica': db.engines['replica']}
+    listeners = {}
+    for name, engine in engines.items():
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany,
+                                  target=statements[name]):
+            target.append(statement)
+        listeners[name] = before_cursor_execute
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for name, engine in engines.items():
+            event.remove(engine, 'before_cursor_execute', listeners[name])
+
+
+@pytest.mark.parametrize('data', ['products', 'movements'])
+def test_export_reads_from_replica(replica_app, client, data):
+    with replica_app.app.app_context():
+        with queries_by_database(replica_app.db) as statements:
+            response = client.get(f'/export?data={data}')
+            # тело ответа читается здесь: строки отдаются при потоковой передаче
+            body = response.get_data()
+
+    assert response.status_code == 200
+    assert body.startswith('\ufeff'.encode('utf-8'))
+    assert statements['replica']
+    assert not statements['primary'], '\n\n'.join(statements['primary'])
+
+
+def test_aggregate_cache_keeps_replica_and_primary_apart(replica_app, client):
+    with replica_app.app.app_context():
+        replica_app.aggregate_cache.invalidate()
+
+        with queries_by_database(replica_app.db) as statements:
+            assert client.get('/').status_code == 200
+        assert statements['replica']
+        assert not statements['primary'], '\n\n'.join(statements['primary'])
+
+        # клиент только что записывал: агрегаты, прочитанные с реплики, ему не отдаются
+        with client.session_transaction() as session:
+            session['primary_until'] = time.time() + 60
+        with queries_by_database(replica_app.db) as statements:
+            assert client.get('/').status_code == 200
+        assert statements['primary']
+        assert not statements['replica'], '\n\n'.join(statements['replica'])
@@ -0,0 +1,38 @@
+"""Деление диапазона id между процессами параллельной загрузки ETL (dwh/etl.py)"""
+import pytest
+
+etl = pytest.importorskip('etl')
+
+
+def covered_ids(ranges):
+    return [i for lo, hi in ranges for i in range(lo + 1, hi + 1)]
+
+
+@pytest.mark.parametrize('last_id, max_id, parts', [
+    (0, 10, 3),
+    (0, 10, 1),
+    (100, 1000, 8),
+    (5, 6, 4),
+    (0, 2, 5),
+    (7, 19, 12),
+])
+def test_ranges_cover_interval_without_overlap(last_id, max_id, parts):
+    ranges = etl.split_id_range(last_id, max_id, parts)
+
+    assert covered_ids(ranges) == list(range(last_id + 1, max_id + 1))
+    assert len(ranges) <= parts
+    assert all(lo < hi for lo, hi in ranges)
+
+
+def test_ranges_are_balanced():
+    assert [hi - lo for lo, hi in etl.split_id_range(0, 1000, 8)] == [125] * 8
+    # остаток достается последнему диапазону
+    assert etl.split_id_range(0, 10, 3) == [(0, 4), (4, 8), (8, 10)]
+
+
+def test_more_parts_than_ids():
+    assert etl.split_id_range(0, 2, 5) == [(0, 1), (1, 2)]
+
+
+def test_empty_interval():
+    assert etl.split_id_range(10, 10, 4) == []